@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import select, insert, exists, or_
+from app.database import SessionLocal
+from app.models import Ticket, AIResponse
+from app.ai_models import get_model
+from app.ticket_events import CLOSED_STATUSES
+from app.ticket_import import TICKET_CATEGORIES, TICKET_PRIORITIES
+
+# Batch AI categorization of the ticket backlog.
+# Covers every active ticket, and every ticket still filed under "other",
+# that has no categorization AIResponse yet. Tickets are packed several per
+# prompt (up to AI_BATCH_TICKETS_PER_PROMPT, or AI_BATCH_MAX_PROMPT_CHARS of
+# ticket text) and the model answers with a JSON array, one entry per ticket.
+# Prompts run on AI_BATCH_CONCURRENCY threads, throttled by a token bucket to
+# AI_BATCH_REQUESTS_PER_MINUTE model calls.
+#
+# Results are stored as ordinary "categorization" suggestions, one commit per
+# prompt, and tickets that already have one are skipped. An interrupted run
+# therefore picks up where it stopped. A failed prompt is retried
+# AI_BATCH_RETRIES times; any tickets it still misses are left for the next run.
+#
+# Run it from the API (POST /api/ai/batch/categorize) or as
+# `python -m app.ai_batch`.
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.environ.get("AI_BATCH_CONCURRENCY", "4"))
+REQUESTS_PER_MINUTE = int(os.environ.get("AI_BATCH_REQUESTS_PER_MINUTE", "120"))
+TICKETS_PER_PROMPT = int(os.environ.get("AI_BATCH_TICKETS_PER_PROMPT", "10"))
+MAX_PROMPT_CHARS = int(os.environ.get("AI_BATCH_MAX_PROMPT_CHARS", "24000"))
+RETRIES = int(os.environ.get("AI_BATCH_RETRIES", "2"))
+# Long descriptions are cut to this many characters in the prompt
+DESCRIPTION_CHARS = 1500
+
+PROMPT_HEADER = (
+    "You are triaging support tickets. For each ticket below, suggest the most appropriate "
+    f"category (one of: {', '.join(TICKET_CATEGORIES)}) and priority (one of: {', '.join(TICKET_PRIORITIES)}).\n"
+    "Respond with only a JSON array containing one object per ticket, with the keys "
+    '"ticket_id" (integer), "category", "priority", "confidence" (0 to 1) and "reasoning" (one sentence).\n\n'
+)
+
+
+class RateLimiter:
+    """Token bucket: `rate_per_minute` acquisitions per minute, bursts up to `burst`."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self._rate = rate_per_minute / 60.0
+        self._capacity = max(1, burst)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+def pending_tickets_statement():
+    """Tickets still to categorize, oldest first."""
+    already_done = exists().where(
+        AIResponse.ticket_id == Ticket.id,
+        AIResponse.suggestion_type == "categorization"
+    )
+    return (
+        select(Ticket.id, Ticket.subject, Ticket.description, Ticket.category, Ticket.priority)
+        .where(or_(Ticket.status.notin_(CLOSED_STATUSES), Ticket.category == "other"), ~already_done)
+        .order_by(Ticket.id)
+    )
+
+
+def ticket_block(row):
+    description = row.description[:DESCRIPTION_CHARS]
+    return (
+        f"### Ticket {row.id}\n"
+        f"Subject: {row.subject}\n"
+        f"Current category: {row.category}, current priority: {row.priority}\n"
+        f"Description: {description}\n\n"
+    )
+
+
+def pack(rows, per_prompt=TICKETS_PER_PROMPT, max_chars=MAX_PROMPT_CHARS):
+    """Group rows into prompts. Yields (rows, prompt) pairs."""
+    batch, blocks, size = [], [], 0
+    for row in rows:
+        block = ticket_block(row)
+        if batch and (len(batch) >= per_prompt or size + len(block) > max_chars):
+            yield batch, PROMPT_HEADER + "".join(blocks)
+            batch, blocks, size = [], [], 0
+        batch.append(row)
+        blocks.append(block)
+        size += len(block)
+    if batch:
+        yield batch, PROMPT_HEADER + "".join(blocks)
+
+
+def parse_results(text, ticket_ids):
+    """Map ticket id -> suggestion dict from the model's JSON reply, dropping
+    entries for unknown tickets or with invalid values."""
+    text = text.strip()
+    if text.startswith("```"):
+        # Some models wrap JSON in a markdown fence despite being told not to
+        text = text.strip("`").removeprefix("json").strip()
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("tickets") or data.get("results") or [data]
+
+    results = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            ticket_id = int(item.get("ticket_id"))
+        except (TypeError, ValueError):
+            continue
+        category = str(item.get("category", "")).lower()
+        priority = str(item.get("priority", "")).lower()
+        if ticket_id not in ticket_ids or category not in TICKET_CATEGORIES or priority not in TICKET_PRIORITIES:
+            continue
+        results[ticket_id] = {
+            "category": category,
+            "priority": priority,
+            "confidence": item.get("confidence"),
+            "reasoning": str(item.get("reasoning") or "").strip(),
+        }
+    return results
+
+
+def suggestion_content(result):
+    # Same shape as the single-ticket categorization suggestions
+    confidence = result["confidence"]
+    confidence = f" (confidence: {round(float(confidence) * 100)}%)" if isinstance(confidence, (int, float)) else ""
+    content = f"Suggested category: {result['category'].upper()}{confidence}. Suggested priority: {result['priority'].upper()}."
+    if result["reasoning"]:
+        content += f" Reasoning: {result['reasoning']}"
+    return content
+
+
+class BatchCategorizer:
+    def __init__(self, concurrency=CONCURRENCY, requests_per_minute=REQUESTS_PER_MINUTE,
+                 session_factory=SessionLocal, model=None):
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(requests_per_minute, burst=concurrency)
+        self.session_factory = session_factory
+        self.model = model
+        self.status = "idle"  # idle -> running -> done | error
+        self.error = None
+        self.total = 0
+        self.prompts = 0
+        self.categorized = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def progress(self):
+        with self._lock:
+            return {
+                "status": self.status,
+                "total": self.total,
+                "prompts": self.prompts,
+                "categorized": self.categorized,
+                "failed": self.failed,
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "error": self.error,
+            }
+
+    def run(self):
+        """Categorize everything pending. Blocking; returns the final progress."""
+        model = self.model or get_model()
+        with self._lock:
+            self.status = "running"
+            self.error = None
+            self.total = self.prompts = self.categorized = self.failed = 0
+            self.started_at = datetime.utcnow()
+            self.finished_at = None
+
+        try:
+            model.check()
+            db = self.session_factory()
+            try:
+                rows = db.execute(pending_tickets_statement()).all()
+            finally:
+                db.close()
+            with self._lock:
+                self.total = len(rows)
+
+            # Bound the prompts queued ahead of the workers
+            slots = threading.Semaphore(self.concurrency * 2)
+
+            def work(batch, prompt):
+                try:
+                    self._categorize(model, batch, prompt)
+                finally:
+                    slots.release()
+
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ai-batch") as executor:
+                for batch, prompt in pack(rows):
+                    slots.acquire()
+                    executor.submit(work, batch, prompt)
+            status = "done"
+        except Exception as e:
+            logger.exception("Batch categorization failed")
+            self.error = str(e)
+            status = "error"
+
+        with self._lock:
+            self.status = status
+            self.finished_at = datetime.utcnow()
+        return self.progress()
+
+    def _categorize(self, model, batch, prompt):
+        ticket_ids = {row.id for row in batch}
+        results = {}
+        for attempt in range(RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                results.update(parse_results(model.generate(prompt, json_output=True), ticket_ids))
+            except Exception as e:
+                logger.warning("Categorization prompt for tickets %s failed (attempt %d): %s",
+                               sorted(ticket_ids), attempt + 1, e)
+                continue
+            if len(results) == len(ticket_ids):
+                break
+
+        if results:
+            db = self.session_factory()
+            try:
+                db.execute(insert(AIResponse.__table__), [
+                    {
+                        "ticket_id": ticket_id,
+                        "suggestion_type": "categorization",
+                        "content": suggestion_content(result),
+                        "model_used": model.name,
+                        "accepted": False,
+                    }
+                    for ticket_id, result in results.items()
+                ])
+                db.commit()
+            except Exception:
+                logger.exception("Could not store categorizations for tickets %s", sorted(results))
+                db.rollback()
+                results = {}
+            finally:
+                db.close()
+
+        with self._lock:
+            self.prompts += 1
+            self.categorized += len(results)
+            self.failed += len(ticket_ids) - len(results)
+
+
+class BatchRunner:
+    """At most one background batch run per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+        self._thread = None
+
+    def start(self):
+        """Start a run in a background thread; returns False if one is already running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._current = BatchCategorizer()
+            self._thread = threading.Thread(target=self._current.run, name="ai-batch-runner", daemon=True)
+            self._thread.start()
+            return True
+
+    def progress(self):
+        with self._lock:
+            current = self._current
+        return current.progress() if current else BatchCategorizer().progress()
+
+
+batch_runner = BatchRunner()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    categorizer = BatchCategorizer()
+
+    def report():
+        while categorizer.status in ("idle", "running"):
+            time.sleep(5)
+            p = categorizer.progress()
+            if p["status"] == "running":
+                print(f"{p['categorized'] + p['failed']}/{p['total']} tickets, {p['failed']} failed", flush=True)
+
+    threading.Thread(target=report, daemon=True).start()
+    print(json.dumps(categorizer.run(), indent=2))
@@ -0,0 +1,145 @@
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import select
+from app.models import TicketReply, AIResponse
+from app.related_articles import related_articles
+
+# Prompt context for AI suggestions, kept within a token budget.
+# The ticket header (subject, description, status) always goes in. Replies
+# follow newest first until the budget (AI_CONTEXT_TOKEN_BUDGET) runs out.
+# When older replies don't fit and the ticket has a stored "summary"
+# suggestion, that summary stands in for the replies it covers. Internal
+# notes are never sent to the model.
+# Up to PROMPT_ARTICLES related knowledge base articles (title and opening
+# excerpt, see app/related_articles.py) get a fifth of the budget, before the
+# replies.
+#
+# Formatted replies are cached per ticket (LRU, AI_CONTEXT_CACHE_SIZE tickets),
+# so each build only loads replies newer than the last one it has seen.
+# Replies are never edited or deleted, so the cache only ever grows.
+#
+# Tokens are estimated at ~4 characters each, which is close enough for
+# budgeting and needs no tokenizer.
+
+TOKEN_BUDGET = int(os.environ.get("AI_CONTEXT_TOKEN_BUDGET", "3000"))
+CACHE_SIZE = int(os.environ.get("AI_CONTEXT_CACHE_SIZE", "512"))
+CHARS_PER_TOKEN = 4
+PROMPT_ARTICLES = 3
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 3)] + "..."
+
+
+class _TicketReplies:
+    """Cached, formatted replies of one ticket, oldest first."""
+
+    def __init__(self):
+        self.last_reply_id = 0
+        self.lines = []  # (created_at, line, tokens)
+        self.lock = threading.Lock()
+
+
+class ContextBuilder:
+    def __init__(self, budget=TOKEN_BUDGET, cache_size=CACHE_SIZE):
+        self.budget = budget
+        self._cache_size = cache_size
+        self._tickets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, ticket_id):
+        with self._lock:
+            entry = self._tickets.get(ticket_id)
+            if entry is None:
+                entry = self._tickets[ticket_id] = _TicketReplies()
+            self._tickets.move_to_end(ticket_id)
+            while len(self._tickets) > self._cache_size:
+                self._tickets.popitem(last=False)
+            return entry
+
+    def _replies(self, db, ticket_id):
+        # Single replies are capped so one huge paste can't crowd out the rest
+        max_reply_tokens = max(1, self.budget // 4)
+        entry = self._entry(ticket_id)
+        with entry.lock:
+            new_rows = db.execute(
+                select(TicketReply.id, TicketReply.author, TicketReply.content, TicketReply.created_at)
+                .where(
+                    TicketReply.ticket_id == ticket_id,
+                    TicketReply.id > entry.last_reply_id,
+                    TicketReply.is_internal.isnot(True)
+                )
+                .order_by(TicketReply.id)
+            ).all()
+            for row in new_rows:
+                line = f"- {row.author}: {truncate(row.content, max_reply_tokens)}\n"
+                entry.lines.append((row.created_at, line, estimate_tokens(line)))
+                entry.last_reply_id = row.id
+            return list(entry.lines)
+
+    def _latest_summary(self, db, ticket_id):
+        return db.execute(
+            select(AIResponse.content, AIResponse.generated_at)
+            .where(AIResponse.ticket_id == ticket_id, AIResponse.suggestion_type == "summary")
+            .order_by(AIResponse.generated_at.desc(), AIResponse.id.desc())
+            .limit(1)
+        ).first()
+
+    def _articles(self, ticket, budget):
+        articles = related_articles.for_ticket(ticket, PROMPT_ARTICLES)
+        if not articles:
+            return ""
+        # Each line also carries its title and punctuation
+        per_article = max(1, budget // len(articles) - 8)
+        lines = [
+            f"- {article['title']}: {truncate(article['excerpt'], per_article)}\n"
+            for article in articles
+        ]
+        return "Relevant knowledge base articles:\n" + "".join(lines)
+
+    def build(self, db, ticket):
+        """Context text for `ticket` (an ORM Ticket) within the token budget."""
+        header = (
+            f"Ticket Subject: {ticket.subject}\n"
+            f"Description: {truncate(ticket.description, self.budget // 3)}\n"
+            f"Status: {ticket.status}, Priority: {ticket.priority}, Category: {ticket.category}\n"
+        )
+        articles_text = self._articles(ticket, self.budget // 5)
+        # Less a little for the "History:" and "replies omitted" lines
+        remaining = self.budget - estimate_tokens(header) - estimate_tokens(articles_text) - 16
+        replies = self._replies(db, ticket.id)
+
+        summary_text = ""
+        if sum(tokens for _, _, tokens in replies) > remaining:
+            summary = self._latest_summary(db, ticket.id)
+            if summary is not None:
+                # The summary replaces the replies it was generated from
+                summary_text = f"Summary of earlier conversation:\n{truncate(summary.content, remaining // 3)}\n"
+                remaining -= estimate_tokens(summary_text)
+                if summary.generated_at is not None:
+                    # >=: timestamps may only have second resolution, keep ties
+                    replies = [r for r in replies if r[0] is None or r[0] >= summary.generated_at]
+
+        included = []
+        for _, line, tokens in reversed(replies):
+            if tokens > remaining:
+                break
+            included.append(line)
+            remaining -= tokens
+        omitted = len(replies) - len(included)
+
+        context = header + articles_text + summary_text + "History:\n"
+        if omitted:
+            context += f"({omitted} earlier replies omitted)\n"
+        return context + "".join(reversed(included))
+
+
+context_builder = ContextBuilder()
@@ -0,0 +1,278 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.database import SessionLocal
+from app.models import AIResponse
+from app.ai_models import get_model
+
+# Background queue for AI suggestions.
+# The model call (app/ai_models.py) is synchronous and can take several
+# seconds, so it runs on a small thread pool instead of the event loop.
+# POST /api/ai/suggest enqueues a job and returns its id straight away; the
+# page polls GET /api/ai/jobs/{id} for the result.
+#
+# Suggestions are content-addressed per ticket: the key is a hash of ticket
+# id, model, suggestion type and the assembled prompt, so an unchanged ticket
+# thread maps to the same key. The ticket id is part of it because the cached
+# result is that ticket's stored AIResponse; duplicate tickets with identical
+# text each get their own. Recent results are kept in an LRU/TTL cache
+# pointing at the stored AIResponse, and identical requests arriving while
+# one is in flight share the same job instead of calling the model again.
+#
+# The SSE endpoint submits a streaming job: the worker uses the model's
+# stream() and appends text to the job as it arrives, so streams share the
+# pool limit, the cache and the in-flight job with the POST path. stream_events()
+# follows a job from the event loop, woken by the worker on each piece of text,
+# so an open stream holds no thread while it waits.
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get("AI_WORKERS", "4"))
+# Jobs waiting or running at once; beyond this requests are rejected with 503
+MAX_PENDING = int(os.environ.get("AI_MAX_PENDING", "32"))
+# How long finished jobs stay pollable
+JOB_TTL_SECONDS = 600
+CACHE_TTL_SECONDS = int(os.environ.get("AI_CACHE_TTL_SECONDS", "3600"))
+CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", "1024"))
+
+SUGGESTION_TYPES = ("reply_draft", "summary", "categorization")
+
+def build_prompt(context, suggestion_type):
+    # context comes from app/ai_context.py
+    if suggestion_type == "reply_draft":
+        return f"You are a helpful support agent. Draft a professional and empathetic reply to this ticket. Context:\n{context}"
+    elif suggestion_type == "summary":
+        return f"Summarize the key points of this support ticket conversation in 3-5 bullet points. Context:\n{context}"
+    elif suggestion_type == "categorization":
+        return f"Analyze this ticket and suggest the most appropriate Category (bug, feature_request, question, billing, account, other) and Priority (low, medium, high, urgent). Provide reasoning. Context:\n{context}"
+    raise ValueError(f"Invalid suggestion type: {suggestion_type}")
+
+
+def suggestion_key(ticket_id, suggestion_type, prompt, model=None):
+    model = model or get_model().name
+    digest = hashlib.sha256()
+    for part in (str(ticket_id), model, suggestion_type, prompt):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def save_suggestion(ticket_id, suggestion_type, content, model_name):
+    """Store a finished suggestion, return the job result dict for it."""
+    db = SessionLocal()
+    try:
+        ai_resp = AIResponse(
+            ticket_id=ticket_id,
+            suggestion_type=suggestion_type,
+            content=content,
+            model_used=model_name
+        )
+        db.add(ai_resp)
+        db.commit()
+        return {"id": ai_resp.id, "content": content, "ticket_id": ticket_id}
+    finally:
+        db.close()
+
+
+class QueueFull(Exception):
+    pass
+
+
+class SuggestionCache:
+    """LRU cache of suggestion key -> stored result, entries expire after `ttl` seconds."""
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL_SECONDS):
+        self._size = size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+
+class Job:
+    def __init__(self, ticket_id, suggestion_type, prompt, key, stream=False):
+        self.id = uuid.uuid4().hex
+        self.ticket_id = ticket_id
+        self.suggestion_type = suggestion_type
+        self.prompt = prompt
+        self.key = key
+        self.stream = stream
+        self.status = "pending"  # pending -> running -> done | error
+        self.parts = []  # text streamed so far, streaming jobs only
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.cached = False
+        self._watchers = []
+        self._watch_lock = threading.Lock()
+
+    def watch(self, callback):
+        """Call `callback()`, from the worker thread, on new text and when the job finishes."""
+        with self._watch_lock:
+            self._watchers.append(callback)
+
+    def unwatch(self, callback):
+        with self._watch_lock:
+            self._watchers.remove(callback)
+
+    def _notify(self):
+        with self._watch_lock:
+            watchers = list(self._watchers)
+        for callback in watchers:
+            callback()
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.status, "ticket_id": self.ticket_id, "cached": self.cached}
+        if self.status == "done":
+            data.update(self.result)
+        elif self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+class SuggestionQueue:
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-suggest")
+        self._max_pending = max_pending
+        self._jobs = {}
+        self._inflight = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.cache = SuggestionCache()
+
+    def submit(self, ticket_id, suggestion_type, prompt, stream=False):
+        """Return a job for this prompt: a finished one on a cache hit, the
+        in-flight one if an identical request is already running, else a new one.
+        A new `stream` job publishes the model's text as it arrives (see
+        stream_events). Raises QueueFull when the pool is at capacity."""
+        key = suggestion_key(ticket_id, suggestion_type, prompt)
+        job = Job(ticket_id, suggestion_type, prompt, key, stream)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            job.status = "done"
+            job.result = cached
+            job.cached = True
+            job.finished_at = time.monotonic()
+            with self._lock:
+                self._prune()
+                self._jobs[job.id] = job
+            return job
+
+        with self._lock:
+            self._prune()
+            running = self._inflight.get(key)
+            if running is not None:
+                return running
+            if self._pending >= self._max_pending:
+                raise QueueFull()
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.monotonic() - JOB_TTL_SECONDS
+        expired = [jid for jid, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def _run(self, job):
+        job.status = "running"
+        try:
+            job.result = self._generate(job)
+            self.cache.put(job.key, job.result)
+            job.status = "done"
+        except Exception as e:
+            logger.exception("AI suggestion failed for ticket %s", job.ticket_id)
+            job.error = str(e)
+            job.status = "error"
+        finally:
+            job.finished_at = time.monotonic()
+            with self._lock:
+                self._pending -= 1
+                self._inflight.pop(job.key, None)
+            job._notify()
+
+    def _generate(self, job):
+        model = get_model()
+        if job.stream:
+            for text in model.stream(job.prompt):
+                job.parts.append(text)
+                job._notify()
+            content = "".join(job.parts)
+        else:
+            content = model.generate(job.prompt)
+        return save_suggestion(job.ticket_id, job.suggestion_type, content, model.name)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+suggestions = SuggestionQueue()
+
+
+async def stream_events(job):
+    """Yield ("token", text) pairs as `job` produces them, then ("done", result)
+    or ("error", message). Text from a job that didn't stream (a cache hit, or
+    an identical POST already in flight) is sent as a single token."""
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def wake():
+        try:
+            loop.call_soon_threadsafe(changed.set)
+        except RuntimeError:
+            pass  # loop closed, the client is gone
+
+    job.watch(wake)
+    try:
+        sent = 0
+        while True:
+            changed.clear()
+            # Status first: all text is appended before the job is marked done
+            status = job.status
+            parts = job.parts[sent:]
+            sent += len(parts)
+            for text in parts:
+                yield "token", text
+            if status == "done":
+                if not job.stream or job.cached:
+                    yield "token", job.result["content"]
+                yield "done", dict(job.result, cached=job.cached)
+                return
+            if status == "error":
+                yield "error", job.error
+                return
+            await changed.wait()
+    finally:
+        job.unwatch(wake)
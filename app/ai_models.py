@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# Model backends for the AI assistant, picked with AI_MODEL_BACKEND:
+# - "gemini" (default): Google Gemini through the google-genai SDK.
+# - "fake": a local, deterministic stand-in with no network access, for
+#   development and tests. It streams its answer word by word, sleeping
+#   AI_FAKE_TOKEN_DELAY seconds between words.
+# Both expose generate(prompt) -> str and stream(prompt) -> iterator of text chunks.
+# generate(prompt, json_output=True) asks for a JSON reply; the fake model
+# answers those with keyword-based categorizations of the "### Ticket <id>"
+# blocks that app/ai_batch.py packs into its prompts.
+
+AI_MODEL_BACKEND = os.environ.get("AI_MODEL_BACKEND", "gemini").lower()
+GEMINI_MODEL = "gemini-2.5-flash"
+FAKE_TOKEN_DELAY = float(os.environ.get("AI_FAKE_TOKEN_DELAY", "0.02"))
+
+
+# Fake model categorization: first keyword match wins
+FAKE_TICKET_BLOCK = re.compile(r"^### Ticket (\d+)\n(.*?)(?=^### Ticket |\Z)", re.M | re.S)
+FAKE_CATEGORY_WORDS = [
+    ("billing", ("charge", "invoice", "refund", "billing", "subscription")),
+    ("account", ("login", "password", "sso", "account")),
+    ("bug", ("error", "500", "crash", "not working", "broken", "slow")),
+    ("feature_request", ("feature", "would love", "integration", "dark mode")),
+    ("question", ("how to", "how do", "?")),
+]
+FAKE_PRIORITY_WORDS = [
+    ("urgent", ("urgent", "outage", "charged twice", "data loss")),
+    ("high", ("error", "500", "cannot", "can't", "slow")),
+    ("low", ("feature", "would love", "question")),
+]
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class GeminiModel:
+    name = GEMINI_MODEL
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        if not os.environ.get("GOOGLE_API_KEY"):
+            raise ModelUnavailable("GOOGLE_API_KEY not set")
+
+    def client(self):
+        """Shared Gemini client, created on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # Imported here: the SDK is slow to import and most workers
+                    # never call it before their first suggestion
+                    from google import genai
+                    self._client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
+        return self._client
+
+    def generate(self, prompt, json_output=False):
+        config = {"response_mime_type": "application/json"} if json_output else None
+        return self.client().models.generate_content(model=self.name, contents=prompt, config=config).text
+
+    def stream(self, prompt):
+        for chunk in self.client().models.generate_content_stream(model=self.name, contents=prompt):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeModel:
+    name = "fake"
+
+    def __init__(self, token_delay=FAKE_TOKEN_DELAY):
+        self.token_delay = token_delay
+
+    def check(self):
+        pass
+
+    def generate(self, prompt, json_output=False):
+        if json_output:
+            return json.dumps(self._categorize(prompt))
+        # Same prompt, same answer, like a cached model would give
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        subject = re.search(r"Ticket Subject: (.*)", prompt)
+        about = subject.group(1) if subject else prompt.strip().splitlines()[0][:80]
+        return (
+            f"Thanks for reaching out about \"{about}\". We have looked into this and "
+            f"will follow up with next steps shortly. (fake model response {digest})"
+        )
+
+    def _categorize(self, prompt):
+        results = []
+        for match in FAKE_TICKET_BLOCK.finditer(prompt):
+            text = match.group(2).lower()
+            category = next((c for c, words in FAKE_CATEGORY_WORDS if any(w in text for w in words)), "other")
+            priority = next((p for p, words in FAKE_PRIORITY_WORDS if any(w in text for w in words)), "medium")
+            results.append({
+                "ticket_id": int(match.group(1)),
+                "category": category,
+                "priority": priority,
+                "confidence": 0.5,
+                "reasoning": "Keyword match (fake model)."
+            })
+        return results
+
+    def stream(self, prompt):
+        for word in re.findall(r"\S+\s*", self.generate(prompt)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word
+
+
+BACKENDS = {"gemini": GeminiModel, "fake": FakeModel}
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """The configured model backend, created on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if AI_MODEL_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown AI_MODEL_BACKEND: {AI_MODEL_BACKEND!r}")
+                _model = BACKENDS[AI_MODEL_BACKEND]()
+    return _model
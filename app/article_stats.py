@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from sqlalchemy import update, bindparam, func
+from app.models import KnowledgeArticle
+
+# Write-behind counters for knowledge article views and helpful votes.
+# The public article pages only bump an in-memory buffer; a daemon thread
+# flushes the accumulated increments every ARTICLE_STATS_FLUSH_SECONDS in one
+# transaction of "views = views + n" updates (and once more on shutdown).
+# Relative updates mean no increments are lost between concurrent requests or
+# worker processes, and readers never wait on a per-view write.
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.environ.get("ARTICLE_STATS_FLUSH_SECONDS", "10"))
+
+_table = KnowledgeArticle.__table__
+_increment = (
+    update(_table)
+    .where(_table.c.id == bindparam("article_id"))
+    .values(
+        views=func.coalesce(_table.c.views, 0) + bindparam("add_views"),
+        helpful_votes=func.coalesce(_table.c.helpful_votes, 0) + bindparam("add_votes"),
+    )
+)
+
+
+class ArticleStatsBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # article id -> [views, votes] not yet written
+        self._pending = defaultdict(lambda: [0, 0])
+        self._stop = threading.Event()
+        self._thread = None
+        self._session_factory = None
+
+    def add_view(self, article_id):
+        with self._lock:
+            self._pending[article_id][0] += 1
+
+    def add_vote(self, article_id):
+        with self._lock:
+            self._pending[article_id][1] += 1
+
+    def pending(self, article_id):
+        """(views, votes) counted but not flushed yet."""
+        with self._lock:
+            views, votes = self._pending.get(article_id, (0, 0))
+            return views, votes
+
+    def flush(self, db):
+        with self._lock:
+            batch, self._pending = self._pending, defaultdict(lambda: [0, 0])
+        if not batch:
+            return 0
+
+        rows = [
+            {"article_id": article_id, "add_views": views, "add_votes": votes}
+            for article_id, (views, votes) in batch.items()
+        ]
+        try:
+            db.execute(_increment, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                for article_id, (views, votes) in batch.items():
+                    self._pending[article_id][0] += views
+                    self._pending[article_id][1] += votes
+            raise
+        return len(rows)
+
+    def _flush_with(self, session_factory):
+        db = session_factory()
+        try:
+            self.flush(db)
+        except Exception:
+            logger.exception("Article stats flush failed")
+        finally:
+            db.close()
+
+    def start(self, session_factory, interval=FLUSH_SECONDS):
+        self._session_factory = session_factory
+
+        def run():
+            while not self._stop.wait(interval):
+                self._flush_with(session_factory)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="article-stats", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._session_factory is not None:
+            self._flush_with(self._session_factory)
+
+
+article_stats = ArticleStatsBuffer()
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import func
+from app.models import Ticket
+
+# In-memory dashboard counters.
+# Subscribed to ticket lifecycle events (app/ticket_events.py), so every
+# create, edit, resolve and close is applied as it happens and the dashboard
+# reads the totals without scanning the tickets table. SLA buckets live in
+# app/sla_engine.py. A background thread reconciles against the database every
+# DASHBOARD_RECONCILE_SECONDS to pick up drift, e.g. changes made by other
+# worker processes or directly in the database.
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_SECONDS = int(os.environ.get("DASHBOARD_RECONCILE_SECONDS", "300"))
+
+
+class DashboardCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = Counter()
+        self._priority = Counter()
+        self._resolved_by_day = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded = False
+
+    # Incremental updates
+
+    def apply(self, old, new):
+        """Move a ticket from state `old` to `new`; either may be None (create / delete)."""
+        with self._lock:
+            if old is not None:
+                self._add(old, -1)
+            if new is not None:
+                self._add(new, 1)
+
+    def _add(self, state, sign):
+        self._status[state.status] += sign
+        self._priority[state.priority] += sign
+        if state.status == "resolved" and state.resolved_at:
+            day = state.resolved_at.date()
+            # Days older than the last reconcile are not tracked
+            if sign > 0 or day in self._resolved_by_day:
+                self._resolved_by_day[day] += sign
+
+    # Reads
+
+    def read(self, now=None):
+        now = now or datetime.utcnow()
+        with self._lock:
+            status_dict = {s: c for s, c in self._status.items() if c > 0}
+            priority_dict = {p: c for p, c in self._priority.items() if c > 0}
+            return {
+                "status_dict": status_dict,
+                "priority_dict": priority_dict,
+                "total_tickets": sum(status_dict.values()),
+                "open_tickets": status_dict.get("open", 0),
+                "resolved_today": self._resolved_by_day.get(now.date(), 0),
+            }
+
+    # Reconciliation
+
+    def reconcile(self, db):
+        status_counts = Counter(dict(db.query(Ticket.status, func.count(Ticket.id)).group_by(Ticket.status).all()))
+        priority_counts = Counter(dict(db.query(Ticket.priority, func.count(Ticket.id)).group_by(Ticket.priority).all()))
+
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        resolved_today = db.query(Ticket).filter(
+            Ticket.status == 'resolved',
+            Ticket.resolved_at >= today_start
+        ).count()
+
+        with self._lock:
+            self._status = status_counts
+            self._priority = priority_counts
+            self._resolved_by_day = Counter({today_start.date(): resolved_today})
+            self.loaded = True
+
+    def start(self, session_factory, interval=RECONCILE_SECONDS):
+        """Reconcile now, then keep reconciling every `interval` seconds in a daemon thread."""
+        db = session_factory()
+        try:
+            self.reconcile(db)
+        finally:
+            db.close()
+
+        def run():
+            while not self._stop.wait(interval):
+                db = session_factory()
+                try:
+                    self.reconcile(db)
+                except Exception:
+                    logger.exception("Dashboard counter reconcile failed")
+                finally:
+                    db.close()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="dashboard-counters", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+counters = DashboardCounters()
@@ -1,24 +1,164 @@
 import os
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     os.makedirs("/data", exist_ok=True)
     DATABASE_URL = "sqlite:////data/app.db"
 
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+# Optional read replica; GET/HEAD requests read from it when set
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
+
+
+def to_async_url(url):
+    """Map a sync database URL onto its asyncio driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+")[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+# The async route handlers use these; override if the async driver needs a
+# different URL (e.g. asyncpg's own sslmode spelling)
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+ASYNC_DATABASE_READ_URL = os.environ.get("ASYNC_DATABASE_READ_URL") or (
+    to_async_url(DATABASE_READ_URL) if DATABASE_READ_URL else None
 )
 
+# Connection pool (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# SQLite tuning. WAL lets readers run alongside the single writer, and
+# synchronous=NORMAL is durable across app crashes in WAL mode.
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _is_memory_sqlite(url):
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    # Negative cache_size is in KiB
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def make_engine(url):
+    if url.startswith("sqlite"):
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if not _is_memory_sqlite(url):
+            kwargs.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+        new_engine = create_engine(url, **kwargs)
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+        return new_engine
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+def make_async_engine(url):
+    if url.startswith("sqlite"):
+        kwargs = {}
+        if not _is_memory_sqlite(url):
+            # aiosqlite defaults to NullPool, which would reconnect (and rerun
+            # the pragmas) on every checkout
+            kwargs.update(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+        new_engine = create_async_engine(url, **kwargs)
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        return new_engine
+
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if DATABASE_READ_URL else SessionLocal
+
+async_engine = make_async_engine(ASYNC_DATABASE_URL)
+async_read_engine = make_async_engine(ASYNC_DATABASE_READ_URL) if ASYNC_DATABASE_READ_URL else async_engine
+
+# expire_on_commit=False: attributes can't be lazily reloaded under asyncio,
+# and handlers still read the object after committing
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+) if ASYNC_DATABASE_READ_URL else AsyncSessionLocal
 
 Base = declarative_base()
 
-def get_db():
+def get_db(request: Request):
+    # GET/HEAD handlers only read, so they can use the replica. A replica may
+    # lag slightly behind writes; background writers (view counters etc.)
+    # always use SessionLocal.
+    if request.method in ("GET", "HEAD"):
+        db = ReadSessionLocal()
+    else:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_write_db():
+    # Always the primary, for code that may write regardless of method
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request):
+    # Same read routing as get_db, on the asyncio engine
+    if request.method in ("GET", "HEAD"):
+        session_factory = AsyncReadSessionLocal
+    else:
+        session_factory = AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
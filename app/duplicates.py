@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+import numpy as np
+from sqlalchemy import select
+from app.models import Ticket
+from app.ticket_events import CLOSED_STATUSES, is_active
+
+# Likely-duplicate detection for tickets, with MinHash + locality-sensitive hashing.
+# A ticket's subject and description are reduced to a set of word shingles
+# (single words and adjacent pairs) and summarised as NUM_PERM min-hashes; the
+# fraction of equal min-hashes between two tickets estimates the Jaccard
+# similarity of their shingle sets. The signature is cut into BANDS bands of
+# ROWS hashes and every band is a hash-table bucket key, so a lookup only
+# compares a new ticket with tickets sharing at least one whole band (pairs
+# around DUPLICATE_THRESHOLD similarity or above) and never scans the table.
+#
+# Only active tickets are indexed, since those are the ones worth flagging.
+# Creating or editing a ticket adds it (add(), from the ticket routes);
+# resolving or closing one removes it (apply(), a ticket lifecycle listener).
+# A background thread re-syncs with the database every DUPLICATE_SYNC_SECONDS,
+# hashing only tickets it has not seen (other workers, bulk imports, reopened
+# tickets), and saves the signatures to DUPLICATE_INDEX_PATH. A restart loads
+# that file and only hashes what changed since.
+#
+# `python -m app.duplicates cluster` groups the whole ticket history, closed
+# tickets included, into clusters of likely duplicates.
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.environ.get("DUPLICATE_INDEX_PATH", "/data/duplicate_index.npz")
+SYNC_SECONDS = int(os.environ.get("DUPLICATE_SYNC_SECONDS", "300"))
+THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", "0.5"))
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Fixed, so signatures stay comparable across processes and restarts
+HASH_SEED = 20240601
+# Stored with the saved index; a file written with other parameters is ignored
+PARAMS = f"minhash-v1:{NUM_PERM}:{BANDS}:{HASH_SEED}"
+
+_rng = np.random.default_rng(HASH_SEED)
+# Multiply-shift hash family over 32-bit shingle hashes (uint64 arithmetic wraps)
+_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_PAIR_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def shingles(subject, description):
+    """32-bit hashes of the word and word-pair shingles of a ticket."""
+    words = np.array([zlib.crc32(w.encode()) for w in tokenize(f"{subject} {description}")], dtype=np.uint64)
+    pairs = (words[:-1] * _PAIR_MULTIPLIER + words[1:]) >> np.uint64(32)
+    return np.unique(np.concatenate([words, pairs]))
+
+
+def signature(subject, description):
+    """MinHash signature (NUM_PERM uint32), or None for a ticket with no words."""
+    hashes = shingles(subject, description)
+    if not len(hashes):
+        return None
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig):
+    return [sig[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+
+def similarity(a, b):
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class DuplicateIndex:
+    def __init__(self, path=INDEX_PATH, threshold=THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._signatures = {}  # ticket id -> signature, active tickets only
+        self._buckets = [{} for _ in range(BANDS)]  # band key -> set of ticket ids
+        self._dirty = False
+        self._database = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded = False
+
+    # Updates
+
+    def _insert(self, ticket_id, sig):
+        self._remove(ticket_id)
+        self._signatures[ticket_id] = sig
+        for buckets, key in zip(self._buckets, band_keys(sig)):
+            buckets.setdefault(key, set()).add(ticket_id)
+
+    def _remove(self, ticket_id):
+        sig = self._signatures.pop(ticket_id, None)
+        if sig is None:
+            return
+        for buckets, key in zip(self._buckets, band_keys(sig)):
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ticket_id)
+                if not bucket:
+                    del buckets[key]
+
+    def add(self, ticket_id, subject, description):
+        """Index (or re-index) an active ticket. Returns its likely duplicates
+        among the other indexed tickets, as in similar()."""
+        sig = signature(subject, description)
+        with self._lock:
+            if sig is None:
+                self._remove(ticket_id)
+                return []
+            matches = self._matches(sig, exclude=ticket_id)
+            self._insert(ticket_id, sig)
+            self._dirty = True
+        return matches
+
+    def apply(self, old, new):
+        """Ticket lifecycle listener: drop tickets that are resolved, closed or deleted.
+        New and reopened tickets are added by add() or the next sync()."""
+        if new is None or not is_active(new):
+            ticket_id = (new or old).id
+            with self._lock:
+                if ticket_id in self._signatures:
+                    self._remove(ticket_id)
+                    self._dirty = True
+
+    # Lookups
+
+    def _matches(self, sig, exclude=None, limit=5):
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys(sig)):
+            candidates.update(buckets.get(key, ()))
+        candidates.discard(exclude)
+        scored = [(similarity(sig, self._signatures[c]), c) for c in candidates]
+        scored = sorted((s for s in scored if s[0] >= self.threshold), reverse=True)[:limit]
+        return [(ticket_id, round(score, 3)) for score, ticket_id in scored]
+
+    def similar(self, ticket_id, subject, description, limit=5):
+        """Likely duplicates of a ticket among the active tickets, as
+        (ticket id, estimated similarity) pairs, most similar first."""
+        with self._lock:
+            sig = self._signatures.get(ticket_id)
+        if sig is None:
+            sig = signature(subject, description)
+            if sig is None:
+                return []
+        with self._lock:
+            return self._matches(sig, exclude=ticket_id, limit=limit)
+
+    # Database sync and persistence
+
+    def sync(self, db):
+        """Match the index to the database's active tickets, hashing only
+        those not indexed yet."""
+        # Taken before the query, so tickets added meanwhile are never "stale"
+        with self._lock:
+            known = set(self._signatures)
+        active = set(db.execute(select(Ticket.id).where(Ticket.status.notin_(CLOSED_STATUSES))).scalars())
+        stale = known - active
+        missing = sorted(active - known)
+        for chunk_start in range(0, len(missing), 500):
+            chunk = missing[chunk_start:chunk_start + 500]
+            rows = db.execute(
+                select(Ticket.id, Ticket.subject, Ticket.description).where(Ticket.id.in_(chunk))
+            ).all()
+            signatures = [(row.id, signature(row.subject, row.description)) for row in rows]
+            with self._lock:
+                for ticket_id, sig in signatures:
+                    if sig is not None:
+                        self._insert(ticket_id, sig)
+        with self._lock:
+            for ticket_id in stale:
+                self._remove(ticket_id)
+            if stale or missing:
+                self._dirty = True
+            self.loaded = True
+        return len(missing), len(stale)
+
+    def load_file(self, database):
+        """Load signatures saved for `database` (a fingerprint of its URL).
+        Returns False when there is no usable file."""
+        try:
+            with np.load(self.path) as data:
+                if str(data["params"]) != PARAMS or str(data["database"]) != database:
+                    return False
+                ids, signatures = data["ids"], data["signatures"]
+        except FileNotFoundError:
+            return False
+        except Exception:
+            logger.warning("Ignoring unreadable duplicate index %s", self.path, exc_info=True)
+            return False
+        with self._lock:
+            self._signatures = {}
+            self._buckets = [{} for _ in range(BANDS)]
+            for ticket_id, sig in zip(ids.tolist(), signatures):
+                self._insert(ticket_id, sig)
+            self._dirty = False
+        return True
+
+    def save(self):
+        """Write the signatures to self.path if they changed since the last save."""
+        if not self.path or self._database is None:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            ids = np.array(list(self._signatures), dtype=np.int64)
+            signatures = np.array(list(self._signatures.values()), dtype=np.uint32).reshape(len(ids), NUM_PERM)
+            self._dirty = False
+        buffer = io.BytesIO()
+        np.savez(buffer, params=PARAMS, database=self._database, ids=ids, signatures=signatures)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, self.path)
+        return True
+
+    # Background sync
+
+    def open(self, db, use_file=True):
+        """Load the index saved for this database (unless `use_file` is False)
+        and sync it. Returns whether the file was used."""
+        url = db.get_bind().url.render_as_string(hide_password=True)
+        self._database = hashlib.sha256(url.encode()).hexdigest()[:16]
+        from_file = use_file and self.load_file(self._database)
+        added, removed = self.sync(db)
+        logger.info("Duplicate index: %d active tickets (%s, %d hashed, %d dropped)",
+                    len(self._signatures), "from file" if from_file else "rebuilt", added, removed)
+        return from_file
+
+    def start(self, session_factory, interval=SYNC_SECONDS):
+        """Load the saved index and sync it with the database now, then again
+        every `interval` seconds in a daemon thread."""
+        db = session_factory()
+        try:
+            self.open(db)
+        finally:
+            db.close()
+        self._save_quietly()
+
+        def run():
+            while not self._stop.wait(interval):
+                db = session_factory()
+                try:
+                    self.sync(db)
+                except Exception:
+                    logger.exception("Duplicate index sync failed")
+                finally:
+                    db.close()
+                self._save_quietly()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="duplicate-index", daemon=True)
+        self._thread.start()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except Exception:
+            logger.exception("Could not save duplicate index to %s", self.path)
+
+    def stop(self):
+        self._stop.set()
+        self._save_quietly()
+
+
+duplicates = DuplicateIndex()
+
+
+def cluster_history(db, threshold=THRESHOLD, batch_size=5000):
+    """Group every ticket, closed ones included, into clusters of likely
+    duplicates. Returns lists of ticket ids (oldest first), largest cluster first.
+
+    Leader clustering, in id order: a ticket joins the cluster whose first
+    ticket (its leader) it is most similar to, at `threshold` or above, or
+    starts a new cluster. Band buckets only hold leaders, so each ticket is
+    checked against the distinct leaders sharing one of its bands, and every
+    member is similar to its leader; clusters can't chain through a run of
+    loosely similar tickets."""
+    leader_signatures = {}
+    buckets = [{} for _ in range(BANDS)]
+    clusters = {}  # leader id -> member ids
+
+    rows = db.execute(
+        select(Ticket.id, Ticket.subject, Ticket.description)
+        .order_by(Ticket.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        sig = signature(row.subject, row.description)
+        if sig is None:
+            continue
+        keys = band_keys(sig)
+        candidates = set()
+        for band, key in zip(buckets, keys):
+            candidates.update(band.get(key, ()))
+        if candidates:
+            leaders = sorted(candidates)
+            scores = np.count_nonzero(np.stack([leader_signatures[i] for i in leaders]) == sig, axis=1) / NUM_PERM
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                clusters[leaders[best]].append(row.id)
+                continue
+        leader_signatures[row.id] = sig
+        clusters[row.id] = [row.id]
+        for band, key in zip(buckets, keys):
+            band.setdefault(key, []).append(row.id)
+
+    return sorted((ids for ids in clusters.values() if len(ids) > 1), key=lambda ids: (-len(ids), ids[0]))
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m app.duplicates", description="Duplicate ticket detection")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help=f"rebuild the saved index of active tickets ({INDEX_PATH})")
+    cluster = commands.add_parser("cluster", help="print clusters of likely duplicates across all tickets, as JSON lines")
+    cluster.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        index = DuplicateIndex()
+        db = SessionLocal()
+        try:
+            index.open(db, use_file=False)
+        finally:
+            db.close()
+        index.save()
+    else:
+        db = SessionLocal()
+        try:
+            found = cluster_history(db, args.threshold)
+            subjects = dict(db.execute(
+                select(Ticket.id, Ticket.subject).where(Ticket.id.in_([ids[0] for ids in found]))
+            ).all()) if found else {}
+        finally:
+            db.close()
+        for ids in found:
+            print(json.dumps({"ticket_ids": ids, "size": len(ids), "subject": subjects.get(ids[0])}))
@@ -1,15 +1,37 @@
+import time
+_import_started = time.perf_counter()
+import logging
+import os
+from contextlib import contextmanager
 from fastapi import FastAPI, Depends, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-from app.database import engine, Base, get_db, SessionLocal
+from fastapi.responses import RedirectResponse, Response
+from app.database import engine, read_engine, Base, get_write_db, SessionLocal, async_engine, async_read_engine
 import app.routes as routes_module
-from app.routes import dashboard, tickets, knowledge, sla, ai_assist, billing
+from app.routes import dashboard, tickets, knowledge, sla, ai_assist, billing, reports
 from app.seed import seed_app_data
+from app.counters import counters
+from app.sla_engine import sla_engine
+from app import ticket_events
+from app import search
+from app.ai_jobs import suggestions
+from app.article_stats import article_stats
+from app.related_articles import related_articles
+from app.duplicates import duplicates
+from app.rollups import rollups
+from app import templating
+from app.schema import ensure_schema
+from app import metrics
+from app.subscription_cache import subscription_cache, BillingInvalidationMiddleware, MISSING
 # Start imports for viv-auth and viv-pay
 from viv_auth import init_auth
 from viv_pay import init_pay
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Seed the demo data the first time the schema is created
+SEED_DEMO_DATA = os.environ.get("SEED_DEMO_DATA", "true").lower() in ("1", "true", "yes")
 
 # Health check (must be first)
 @app.get("/health")
@@ -21,15 +43,36 @@ def health_check():
 def api_health_check():
     return {"status": "ok"}
 
+# Prometheus metrics: request latency, in-flight requests and SQL per route (see app/metrics.py)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engines(engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine)
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        return Response(status_code=401)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Initialize Auth
-User, require_auth = init_auth(app, engine, Base, get_db, app_name="Help Desk")
+# (auth/pay write on some GET routes, so they always get the primary database)
+User, require_auth = init_auth(app, engine, Base, get_write_db, app_name="Help Desk")
 
 # Initialize Pay
-create_checkout, get_customer, require_subscription = init_pay(app, engine, Base, get_db, app_name="Help Desk")
+create_checkout, get_customer, require_subscription = init_pay(app, engine, Base, get_write_db, app_name="Help Desk")
 
-# Wrapper: chain auth -> subscription check
+# Wrapper: chain auth -> subscription check, cached per user (see app/subscription_cache.py)
 async def require_active_subscription(request: Request, user=Depends(require_auth)):
-    return await require_subscription(request, user_id=user.id)
+    cached = subscription_cache.get(user.id)
+    if cached is not MISSING:
+        return cached
+    generation = subscription_cache.generation
+    result = await require_subscription(request, user_id=user.id)
+    # Failed checks raise or redirect, so only active subscriptions get here
+    subscription_cache.put(user.id, result, generation)
+    return result
+
+# Billing changes (checkout, payment webhooks) drop cached subscription checks
+app.add_middleware(BillingInvalidationMiddleware)
 
 # Inject dependencies into routes module
 routes_module.User = User
@@ -42,6 +85,16 @@ routes_module.get_customer = get_customer
 app.dependency_overrides[routes_module.get_current_user] = require_auth
 app.dependency_overrides[routes_module.get_active_subscription] = require_active_subscription
 
+# In-memory subsystems fed by ticket lifecycle events
+ticket_events.subscribe(counters.apply)
+ticket_events.subscribe(sla_engine.apply)
+ticket_events.subscribe(duplicates.apply)
+ticket_events.subscribe(rollups.apply)
+ticket_events.subscribe_bulk(counters.reconcile)
+ticket_events.subscribe_bulk(sla_engine.load)
+ticket_events.subscribe_bulk(duplicates.sync)
+ticket_events.subscribe_inserted(rollups.apply_inserted)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -52,17 +105,86 @@ app.include_router(knowledge.router)
 app.include_router(sla.router)
 app.include_router(ai_assist.router)
 app.include_router(billing.router)
+app.include_router(reports.router)
+
+# Startup timing breakdown, logged once startup_event finishes
+startup_timings = {}
+
+@contextmanager
+def _timed(step):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[step] = round((time.perf_counter() - started) * 1000, 1)
+
+startup_timings["module_load"] = round((time.perf_counter() - _import_started) * 1000, 1)
 
 # Startup event
 @app.on_event("startup")
 def startup_event():
-    # Ensure all tables are created
-    import app.models
-    Base.metadata.create_all(bind=engine)
-    
-    # Seed data
-    db = SessionLocal()
-    try:
-        seed_app_data(db)
-    finally:
-        db.close()
+    # Compile every template up front (bytecode-cached across restarts)
+    with _timed("templates"):
+        templating.precompile()
+
+    # DDL only runs when the models changed since the last boot (see app/schema.py)
+    with _timed("schema"):
+        applied, previous = ensure_schema(engine)
+
+    # Demo data goes in once, by whichever worker created the schema;
+    # otherwise run `python -m app.seed`
+    if applied and previous is None and SEED_DEMO_DATA:
+        with _timed("seed"):
+            db = SessionLocal()
+            try:
+                seed_app_data(db)
+            finally:
+                db.close()
+
+    # Knowledge base full-text index (backfills itself if out of sync)
+    with _timed("search_index"):
+        search.setup(engine)
+
+    # Load dashboard counters and the SLA deadline scheduler, both kept
+    # current from ticket lifecycle events
+    with _timed("counters"):
+        counters.start(SessionLocal)
+    with _timed("sla_engine"):
+        sla_engine.start(SessionLocal)
+
+    # TF-IDF index behind "related articles" on tickets and in AI prompts
+    with _timed("related_articles"):
+        related_articles.start(SessionLocal)
+
+    # Duplicate ticket detection, loaded from its saved index
+    with _timed("duplicates"):
+        duplicates.start(SessionLocal)
+
+    # Reporting rollups, backfilled if empty, then flushed from ticket events
+    with _timed("rollups"):
+        rollups.start(SessionLocal)
+
+    # Flush buffered article views/votes periodically
+    article_stats.start(SessionLocal)
+
+    logger.info(
+        "Startup finished in %.1f ms: %s",
+        sum(startup_timings.values()),
+        ", ".join(f"{step}={ms}ms" for step, ms in startup_timings.items())
+    )
+
+@app.on_event("shutdown")
+def shutdown_event():
+    counters.stop()
+    sla_engine.stop()
+    suggestions.shutdown()
+    article_stats.stop()
+    related_articles.stop()
+    duplicates.stop()
+    rollups.stop()
+
+@app.on_event("shutdown")
+async def dispose_async_engines():
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
@@ -0,0 +1,246 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Request and SQL instrumentation, exposed in the Prometheus text format on /metrics.
+# MetricsMiddleware times every request (including streamed bodies) per route
+# template, e.g. "/tickets/{id}" rather than "/tickets/42", and tracks how many
+# are in flight. SQLAlchemy cursor events on every engine (the sync ones and
+# the async ones' sync_engine) count queries and database time against the
+# request that issued them, found through a context variable; queries from
+# background threads are counted under route="(background)".
+#
+# A request that runs the same SQL statement N_PLUS_ONE_THRESHOLD times or more
+# (the shape of a lazy load inside a loop) counts towards db_n_plus_one_total
+# and is logged once per route and statement.
+#
+# Metrics are per process: with several workers, scrape each one (or run one
+# worker per container). Set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" on /metrics.
+
+logger = logging.getLogger(__name__)
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+BACKGROUND = "(background)"
+UNMATCHED = "(unmatched)"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.type}\n"
+
+
+class CounterMetric(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + "".join(
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}\n" for labels, value in values
+        )
+
+
+class GaugeMetric(CounterMetric):
+    type = "gauge"
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+
+class HistogramMetric(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        lines = [self.header()]
+        for labels, (counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {bucket_count}\n")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}\n")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}\n")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}\n")
+        return "".join(lines)
+
+
+http_requests = CounterMetric("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+http_latency = HistogramMetric("http_request_duration_seconds", "HTTP request latency, including the response body.", ("method", "route"))
+http_in_flight = GaugeMetric("http_requests_in_flight", "HTTP requests being handled right now.", ("method", "route"))
+db_queries = CounterMetric("db_queries_total", "SQL statements executed.", ("route",))
+db_time = CounterMetric("db_query_duration_seconds_total", "Time spent executing SQL statements.", ("route",))
+db_queries_per_request = HistogramMetric("db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), QUERY_COUNT_BUCKETS)
+db_n_plus_one = CounterMetric("db_n_plus_one_total", f"Requests that repeated one SQL statement {N_PLUS_ONE_THRESHOLD}+ times.", ("route",))
+
+REGISTRY = [http_requests, http_latency, http_in_flight, db_queries, db_time, db_queries_per_request, db_n_plus_one]
+
+
+def render():
+    return "".join(metric.render() for metric in REGISTRY)
+
+
+# SQL instrumentation
+
+class RequestStats:
+    """SQL activity of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+_reported_n_plus_one = set()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_query_started"].pop()
+    elapsed = time.perf_counter() - started
+    stats = _request_stats.get()
+    if stats is None:
+        db_queries.inc(BACKGROUND)
+        db_time.inc(BACKGROUND, amount=elapsed)
+        return
+    stats.queries += 1
+    stats.seconds += elapsed
+    if not executemany:
+        stats.statements[statement] += 1
+
+
+def _handle_error(exception_context):
+    # The statement failed, so after_cursor_execute won't run for it
+    started = exception_context.connection.info.get("metrics_query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engines(*engines):
+    """Count queries on these (sync) engines; pass async engines' .sync_engine."""
+    for engine in set(engines):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def _record_sql(route, stats):
+    db_queries.inc(route, amount=stats.queries)
+    db_time.inc(route, amount=stats.seconds)
+    db_queries_per_request.observe(stats.queries, route)
+    repeated = [(s, n) for s, n in stats.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+    if repeated:
+        db_n_plus_one.inc(route)
+        for statement, count in repeated:
+            if (route, statement) not in _reported_n_plus_one:
+                _reported_n_plus_one.add((route, statement))
+                logger.warning("Possible N+1 in %s: statement ran %d times in one request: %s",
+                               route, count, " ".join(statement.split())[:300])
+
+
+# Request instrumentation
+
+def route_label(scope):
+    """Route template the request will match, e.g. "/tickets/{id}"."""
+    app = scope.get("app")
+    partial = None
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            # Right path, wrong method (405)
+            partial = route.path
+    return partial or UNMATCHED
+
+
+class MetricsMiddleware:
+    """Pure ASGI, so streamed responses are timed to their last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        # Route templates, not raw paths, keep the label set bounded
+        route = route_label(scope)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        http_in_flight.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            http_in_flight.dec(method, route)
+            http_requests.inc(method, route, str(status[0]))
+            http_latency.observe(elapsed, method, route)
+            _record_sql(route, stats)
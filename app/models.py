@@ -1,7 +1,29 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum, Index, Float
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
+from datetime import datetime
 from app.database import Base
 
+# Triage order for Ticket.priority, most urgent first
+PRIORITY_RANKS = {"urgent": 0, "high": 1, "medium": 2, "low": 3}
+UNKNOWN_PRIORITY_RANK = len(PRIORITY_RANKS)
+
+def priority_rank(priority):
+    return PRIORITY_RANKS.get(priority, UNKNOWN_PRIORITY_RANK)
+
+def _default_priority_rank(context):
+    # Core inserts (bulk import, seeding) that don't set the rank themselves
+    return priority_rank(context.get_current_parameters().get("priority"))
+
+# Stands in for a missing sla_due in Ticket.sla_due_sort, after every real deadline
+NO_SLA_DUE = datetime(9999, 12, 31)
+
+def sla_due_sort(sla_due):
+    return NO_SLA_DUE if sla_due is None else sla_due
+
+def _default_sla_due_sort(context):
+    return sla_due_sort(context.get_current_parameters().get("sla_due"))
+
 class Ticket(Base):
     __tablename__ = "tickets"
 
@@ -11,15 +33,51 @@ class Ticket(Base):
     description = Column(Text, nullable=False)
     status = Column(String, nullable=False) # enum: "open", "in_progress", "waiting", "resolved", "closed"
     priority = Column(String, nullable=False) # enum: "low", "medium", "high", "urgent"
+    priority_rank = Column(Integer, nullable=True, default=_default_priority_rank) # PRIORITY_RANKS[priority], kept in sync below
     category = Column(String, nullable=False) # enum: "bug", "feature_request", "question", "billing", "account", "other"
     assigned_to = Column(String(100), nullable=True)
     customer_email = Column(String, nullable=False)
     customer_name = Column(String(100), nullable=True)
     sla_due = Column(DateTime, nullable=True)
+    # sla_due_sort(sla_due), kept in sync below: a never-NULL copy for the triage
+    # sort, since NULLS LAST keeps SQLite from serving the ORDER BY from an index
+    sla_due_sort = Column(DateTime, nullable=True, default=_default_sla_due_sort)
     resolved_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    # Lazy by default; routes opt into selectinload/joinedload per query
+    replies = relationship("TicketReply", back_populates="ticket", order_by="TicketReply.created_at")
+    ai_responses = relationship("AIResponse", back_populates="ticket", order_by="AIResponse.generated_at")
+
+    @validates("priority")
+    def _sync_priority_rank(self, key, value):
+        self.priority_rank = priority_rank(value)
+        return value
+
+    @validates("sla_due")
+    def _sync_sla_due_sort(self, key, value):
+        self.sla_due_sort = sla_due_sort(value)
+        return value
+
+    # Composite indexes backing keyset pagination in list_tickets:
+    # one per sort mode, plus one per (filter column, sort mode) pair.
+    # The trailing id makes each index match the (sort key, id) cursor exactly.
+    __table_args__ = (
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        Index("ix_tickets_sla_due_id", "sla_due", "id"),
+        Index("ix_tickets_priority_rank_sla_due_sort_id", "priority_rank", "sla_due_sort", "id"),
+        Index("ix_tickets_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tickets_status_sla_due_id", "status", "sla_due", "id"),
+        # Also the triage queue scan for /api/tickets/next (status = 'open')
+        Index("ix_tickets_status_priority_rank_sla_due_sort_id", "status", "priority_rank", "sla_due_sort", "id"),
+        Index("ix_tickets_priority_created_at_id", "priority", "created_at", "id"),
+        Index("ix_tickets_priority_sla_due_id", "priority", "sla_due", "id"),
+        Index("ix_tickets_category_created_at_id", "category", "created_at", "id"),
+        Index("ix_tickets_category_sla_due_id", "category", "sla_due", "id"),
+        Index("ix_tickets_category_priority_rank_sla_due_sort_id", "category", "priority_rank", "sla_due_sort", "id"),
+    )
+
 class TicketReply(Base):
     __tablename__ = "ticket_replies"
 
@@ -30,6 +88,12 @@ class TicketReply(Base):
     is_internal = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    ticket = relationship("Ticket", back_populates="replies")
+
+    __table_args__ = (
+        Index("ix_ticket_replies_ticket_id_created_at", "ticket_id", "created_at"),
+    )
+
 class KnowledgeArticle(Base):
     __tablename__ = "knowledge_articles"
 
@@ -65,3 +129,27 @@ class AIResponse(Base):
     model_used = Column(String, nullable=True)
     accepted = Column(Boolean, default=False)
     generated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    ticket = relationship("Ticket", back_populates="ai_responses")
+
+    __table_args__ = (
+        Index("ix_ai_responses_ticket_id_generated_at", "ticket_id", "generated_at"),
+        # AI activity page, newest first
+        Index("ix_ai_responses_generated_at_id", "generated_at", "id"),
+    )
+
+class TicketRollup(Base):
+    __tablename__ = "ticket_rollups"
+
+    # Pre-aggregated ticket activity for /reports, maintained by app/rollups.py.
+    # The primary key order serves the report reads: one period and dimension
+    # over a range of buckets.
+    period = Column(String(4), primary_key=True) # enum: "hour", "day"
+    dimension = Column(String(20), primary_key=True) # enum: "all", "priority", "category", "assigned_to"
+    bucket = Column(DateTime, primary_key=True) # UTC start of the hour or day
+    value = Column(String(100), primary_key=True) # dimension value, "" for "all" and for unassigned
+    created = Column(Integer, nullable=False, default=0)
+    resolved = Column(Integer, nullable=False, default=0)
+    resolution_seconds = Column(Float, nullable=False, default=0.0) # sum over resolved tickets, MTTR = this / resolved
+    sla_met = Column(Integer, nullable=False, default=0) # resolved tickets with an sla_due, by the deadline
+    sla_breached = Column(Integer, nullable=False, default=0) # ... and after it
@@ -0,0 +1,173 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, bindparam
+from sqlalchemy.dialects import sqlite
+
+# Keyset (cursor) pagination.
+# Instead of OFFSET, each page remembers the sort key of its last row and the
+# next page asks for rows strictly "after" it. With an index matching the sort
+# order the database seeks straight to the cursor, so page N costs the same as page 1.
+#
+# A sort spec is a list of (column, direction, nullable) tuples, direction being
+# "asc" or "desc". Nullable columns sort NULLs last. The last key must be unique
+# (normally the primary key) so the ordering is total.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    payload = []
+    for v in values:
+        if isinstance(v, datetime):
+            payload.append(["dt", v.isoformat()])
+        else:
+            payload.append(["v", v])
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _decode_value(entry, column, nullable):
+    """Check one cursor entry against its sort key and return the bound value."""
+    if not isinstance(entry, list) or len(entry) != 2:
+        raise InvalidCursor("Invalid cursor")
+    tag, value = entry
+    if value is None:
+        if tag != "v" or not nullable:
+            raise InvalidCursor("Invalid cursor")
+        return None
+    expected = _python_type(column)
+    if expected is datetime:
+        if tag != "dt" or not isinstance(value, str):
+            raise InvalidCursor("Invalid cursor")
+        return datetime.fromisoformat(value)
+    if tag != "v":
+        raise InvalidCursor("Invalid cursor")
+    if expected is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif expected is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif expected is str:
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, (str, int, float))
+    if not valid:
+        raise InvalidCursor("Invalid cursor")
+    return value
+
+
+def decode_cursor(cursor, spec):
+    """Decode `cursor` into one value per key of `spec`. Raises InvalidCursor
+    unless every value has the type its column binds, so a tampered cursor is a
+    client error rather than a failure at execution time."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, list) or len(payload) != len(spec):
+        raise InvalidCursor("Invalid cursor")
+    try:
+        return [
+            _decode_value(entry, column, nullable)
+            for entry, (column, _, nullable) in zip(payload, spec)
+        ]
+    except (ValueError, TypeError):
+        # datetime.fromisoformat on a malformed string
+        raise InvalidCursor("Invalid cursor")
+
+
+def _compare(column, direction, value, dialect_name):
+    """Return (beyond, equal) clauses for `column` against the cursor `value`."""
+    bound = bindparam(None, value, type_=column.type)
+    # SQLite stores DateTime as text. Rows written by server_default=func.now()
+    # have no fractional part while Python-bound values always carry ".ffffff",
+    # so a whole-second instant can be stored either way. Text order puts the
+    # short form first, which gives the bounds below.
+    if dialect_name == "sqlite" and isinstance(value, datetime) and value.microsecond == 0:
+        short = bindparam(None, value, type_=sqlite.DATETIME(truncate_microseconds=True))
+        beyond = column > bound if direction == "asc" else column < short
+        return beyond, column.between(short, bound)
+    beyond = column > bound if direction == "asc" else column < bound
+    return beyond, column == bound
+
+
+def _after(spec, values, dialect_name):
+    column, direction, nullable = spec[0]
+    value = values[0]
+    rest = _after(spec[1:], values[1:], dialect_name) if len(spec) > 1 else None
+
+    if nullable and value is None:
+        # Already inside the trailing NULL block
+        return and_(column.is_(None), rest) if rest is not None else column.is_(None)
+
+    beyond, equal = _compare(column, direction, value, dialect_name)
+    clauses = [beyond]
+    if nullable:
+        clauses.append(column.is_(None))
+    if rest is not None:
+        clauses.append(and_(equal, rest))
+    return or_(*clauses)
+
+
+def order_clauses(spec):
+    clauses = []
+    for column, direction, nullable in spec:
+        clause = column.asc() if direction == "asc" else column.desc()
+        if nullable:
+            clause = clause.nulls_last()
+        clauses.append(clause)
+    return clauses
+
+
+def page_statement(stmt, spec, cursor, limit, dialect_name):
+    """Order `stmt` (a Query or select()) by `spec`, seek past `cursor`, and
+    fetch one extra row to tell whether another page follows.
+    Raises InvalidCursor if `cursor` is malformed."""
+    if cursor:
+        values = decode_cursor(cursor, spec)
+        stmt = stmt.filter(_after(spec, values, dialect_name))
+    return stmt.order_by(*order_clauses(spec)).limit(clamp_limit(limit) + 1)
+
+
+def split_page(rows, spec, limit):
+    """Trim the extra row fetched by page_statement, return (rows, next_cursor)."""
+    limit = clamp_limit(limit)
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, col.key) for col, _, _ in spec])
+    return rows, next_cursor
+
+
+def clamp_limit(limit):
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(query, spec, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Fetch one page of an ORM Query. Returns (rows, next_cursor); next_cursor
+    is None on the last page. Raises InvalidCursor if `cursor` is malformed."""
+    dialect_name = query.session.bind.dialect.name
+    rows = page_statement(query, spec, cursor, limit, dialect_name).all()
+    return split_page(rows, spec, limit)
+
+
+async def paginate_async(db, stmt, spec, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """paginate() for a select() of ORM entities on an AsyncSession."""
+    dialect_name = db.bind.dialect.name
+    result = await db.scalars(page_statement(stmt, spec, cursor, limit, dialect_name))
+    return split_page(result.all(), spec, limit)
@@ -0,0 +1,188 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+from app.models import KnowledgeArticle
+
+# Related knowledge articles for a ticket, from a local TF-IDF index.
+# Each published article is tokenized once, as title + content + tags with the
+# title counted twice and the tags three times, and kept as arrays of term
+# columns and log term frequencies. Creating or editing an article re-tokenizes
+# just that article (update_article, called from the knowledge routes after
+# commit). The searchable index is a term -> postings layout in NumPy arrays
+# with sublinear-tf x idf weights, L2-normalised per article. It is rebuilt
+# from the per-article arrays with a few vectorised passes on the first query
+# after a change (milliseconds, no re-tokenizing).
+#
+# A query (ticket subject + description) touches only the postings of its
+# own terms and is scored by cosine similarity. That takes well under a
+# millisecond for a few thousand articles, with no network or external service.
+#
+# Each worker keeps its own index and reloads it from the database every
+# RELATED_ARTICLES_RELOAD_SECONDS, to pick up edits made through other workers.
+
+logger = logging.getLogger(__name__)
+
+RELOAD_SECONDS = int(os.environ.get("RELATED_ARTICLES_RELOAD_SECONDS", "300"))
+DEFAULT_TOP_K = 5
+# Scores below this are noise (a shared common word or two)
+MIN_SCORE = 0.05
+# Start of each article kept for AI prompts
+EXCERPT_CHARS = 400
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my no not of on or our please so that the their then there this to was we what when
+where which who will with you your
+""".split())
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class RelatedArticlesIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vocabulary = {}  # term -> column; only grows, unused columns just have no postings
+        self._docs = {}  # article id -> (title, excerpt, term columns, log tf)
+        self._compiled = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.loaded = False
+
+    def _document(self, title, content, tags):
+        # Caller holds self._lock (the vocabulary is shared)
+        tag_text = " ".join((tags or "").split(","))
+        counts = Counter(tokenize(title) * 2 + tokenize(content) + tokenize(tag_text) * 3)
+        columns = np.array([self._vocabulary.setdefault(t, len(self._vocabulary)) for t in counts], dtype=np.int64)
+        tf = 1 + np.log(np.array(list(counts.values()), dtype=np.float64))
+        excerpt = " ".join((content or "").split())[:EXCERPT_CHARS]
+        return title, excerpt, columns, tf
+
+    # Updates
+
+    def update_article(self, article):
+        """Index (or re-index) one KnowledgeArticle; unpublished ones are dropped."""
+        with self._lock:
+            if article.published is False:
+                self._docs.pop(article.id, None)
+            else:
+                self._docs[article.id] = self._document(article.title, article.content, article.tags)
+            self._compiled = None
+
+    def load(self, db):
+        rows = db.query(
+            KnowledgeArticle.id, KnowledgeArticle.title, KnowledgeArticle.content, KnowledgeArticle.tags
+        ).filter(KnowledgeArticle.published == True).all()
+        with self._lock:
+            self._vocabulary = {}
+            self._docs = {row.id: self._document(row.title, row.content, row.tags) for row in rows}
+            self._compiled = None
+            self.loaded = True
+
+    # Queries
+
+    def _compile(self):
+        ids = list(self._docs)
+        docs = [self._docs[i] for i in ids]
+        n_terms = len(self._vocabulary)
+        lengths = np.array([len(doc[2]) for doc in docs], dtype=np.int64)
+        rows = np.repeat(np.arange(len(ids)), lengths)
+        columns = np.concatenate([doc[2] for doc in docs]) if docs else np.zeros(0, dtype=np.int64)
+        tf = np.concatenate([doc[3] for doc in docs]) if docs else np.zeros(0)
+
+        df = np.bincount(columns, minlength=n_terms)
+        idf = np.log((1 + len(ids)) / (1 + df)) + 1
+        weights = tf * idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights * weights, minlength=len(ids)))
+        norms[norms == 0] = 1.0
+        weights /= norms[rows]
+
+        # Postings grouped by term: term t owns [starts[t], starts[t + 1])
+        order = np.argsort(columns, kind="stable")
+        starts = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=starts[1:])
+        return {
+            "ids": np.array(ids, dtype=np.int64),
+            "titles": [doc[0] for doc in docs],
+            "excerpts": [doc[1] for doc in docs],
+            "vocabulary": self._vocabulary,
+            "idf": idf,
+            "starts": starts,
+            "rows": rows[order],
+            "weights": weights[order],
+        }
+
+    def related(self, text, k=DEFAULT_TOP_K):
+        """Top `k` articles for free text, best first, as dicts with id, title,
+        excerpt and score."""
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = self._compile()
+            compiled = self._compiled
+        n = len(compiled["ids"])
+        # Terms first seen after this compile have no postings yet
+        vocabulary, n_terms = compiled["vocabulary"], len(compiled["idf"])
+        query = Counter(vocabulary[t] for t in tokenize(text) if vocabulary.get(t, n_terms) < n_terms)
+        if not n or not query:
+            return []
+
+        scores = np.zeros(n)
+        query_norm = 0.0
+        starts, rows, weights = compiled["starts"], compiled["rows"], compiled["weights"]
+        for column, count in query.items():
+            weight = (1 + math.log(count)) * compiled["idf"][column]
+            query_norm += weight * weight
+            start, end = starts[column], starts[column + 1]
+            scores[rows[start:end]] += weight * weights[start:end]
+        scores /= math.sqrt(query_norm)
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": int(compiled["ids"][i]),
+                "title": compiled["titles"][i],
+                "excerpt": compiled["excerpts"][i],
+                "score": round(float(scores[i]), 4),
+            }
+            for i in top if scores[i] >= MIN_SCORE
+        ]
+
+    def for_ticket(self, ticket, k=DEFAULT_TOP_K):
+        return self.related(f"{ticket.subject}\n{ticket.description}", k)
+
+    # Background reload
+
+    def start(self, session_factory, interval=RELOAD_SECONDS):
+        """Load now, then reload every `interval` seconds in a daemon thread."""
+        db = session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+        def run():
+            while not self._stop.wait(interval):
+                db = session_factory()
+                try:
+                    self.load(db)
+                except Exception:
+                    logger.exception("Related articles reload failed")
+                finally:
+                    db.close()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="related-articles", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+related_articles = RelatedArticlesIndex()
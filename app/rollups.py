@@ -0,0 +1,369 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, case, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import Ticket, TicketRollup, SLAPolicy
+from app.ticket_events import CLOSED_STATUSES
+from app.seed import bulk_insert
+
+# Pre-aggregated ticket activity behind /reports.
+# ticket_rollups holds one row per (period, dimension, bucket, value): tickets
+# created, tickets resolved, summed resolution time (for MTTR) and SLA met /
+# breached, per hour and per day, overall and per priority (and so per
+# SLAPolicy), category and assigned_to.
+#
+# A ticket's contribution is a function of its current state: it counts as
+# created in the bucket of created_at and, once resolved or closed with a
+# resolved_at, as resolved in the bucket of resolved_at. apply(old, new),
+# subscribed to ticket lifecycle events, subtracts the old state's
+# contribution and adds the new one's, so edits, reassignments and reopens
+# move counts rather than leak them. Bulk imports hand over the states of the
+# rows each batch committed (apply_inserted), applied the same way, so an
+# import costs as much as its own rows. Deltas are buffered and written every
+# ROLLUP_FLUSH_SECONDS as "created = created + n" upserts (and once more on
+# shutdown), so concurrent workers never overwrite each other. Reports lag
+# writes by at most that interval.
+#
+# rebuild(db) recomputes the whole table from tickets with two GROUP BY scans.
+# It is for backfills only: at startup when the table is empty, after
+# `python -m app.seed`, and from `python -m app.rollups rebuild`. It does not
+# see other workers' unflushed deltas, so run it while the app is stopped.
+#
+# Reports read a bounded window of days, so their cost depends on the window
+# and the number of categories/assignees, not on the size of the history.
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.environ.get("ROLLUP_FLUSH_SECONDS", "10"))
+DEFAULT_REPORT_DAYS = 30
+MAX_REPORT_DAYS = 366
+HOURLY_WINDOW = 48
+
+PERIODS = ("hour", "day")
+FIELDS = ("created", "resolved", "resolution_seconds", "sla_met", "sla_breached")
+KEY = ("period", "dimension", "bucket", "value")
+VALUE_LENGTH = TicketRollup.value.type.length
+
+_table = TicketRollup.__table__
+
+
+def _utc(moment):
+    # Postgres returns timestamptz columns (created_at) as aware datetimes
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _truncate(moment, period):
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _dimension_values(priority, category, assigned_to):
+    return (("all", ""), ("priority", priority or ""), ("category", category or ""),
+            ("assigned_to", (assigned_to or "")[:VALUE_LENGTH]))
+
+
+def _upsert(dialect_name):
+    module = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = module.insert(_table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(KEY),
+        set_={field: _table.c[field] + stmt.excluded[field] for field in FIELDS},
+    )
+
+
+def _hour_expression(dialect_name, column):
+    if dialect_name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _seconds_between(dialect_name, start, end):
+    if dialect_name == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400.0
+
+
+def summarize(created, resolved, resolution_seconds, sla_met, sla_breached):
+    judged = sla_met + sla_breached
+    return {
+        "created": created,
+        "resolved": resolved,
+        "mttr_hours": round(resolution_seconds / resolved / 3600, 2) if resolved else None,
+        "sla_met": sla_met,
+        "sla_breached": sla_breached,
+        "sla_compliance": round(100 * sla_met / judged, 1) if judged else None,
+    }
+
+
+class TicketRollups:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (period, dimension, bucket, value) -> [created, resolved, seconds, met, breached] not yet written
+        self._pending = defaultdict(lambda: [0, 0, 0.0, 0, 0])
+        self._stop = threading.Event()
+        self._thread = None
+        self._session_factory = None
+
+    # Incremental updates
+
+    def apply(self, old, new):
+        """Move a ticket from state `old` to `new`; either may be None (create / delete)."""
+        now = datetime.utcnow()
+        with self._lock:
+            if old is not None:
+                self._add(old, -1, now)
+            if new is not None:
+                self._add(new, 1, now)
+
+    def apply_inserted(self, states):
+        """Add tickets inserted in bulk."""
+        now = datetime.utcnow()
+        with self._lock:
+            for state in states:
+                self._add(state, 1, now)
+
+    def _add(self, state, sign, now):
+        created_at = _utc(state.created_at) or now
+        measures = [(created_at, 0, 1)]  # (moment, field, amount)
+        resolved_at = _utc(state.resolved_at)
+        if state.status in CLOSED_STATUSES and resolved_at is not None:
+            measures.append((resolved_at, 1, 1))
+            measures.append((resolved_at, 2, (resolved_at - created_at).total_seconds()))
+            due = _utc(state.sla_due)
+            if due is not None:
+                measures.append((resolved_at, 3 if resolved_at <= due else 4, 1))
+        values = _dimension_values(state.priority, state.category, state.assigned_to)
+        for period in PERIODS:
+            for moment, field, amount in measures:
+                bucket = _truncate(moment, period)
+                for dimension, value in values:
+                    self._pending[(period, dimension, bucket, value)][field] += sign * amount
+
+    def flush(self, db):
+        with self._lock:
+            batch, self._pending = self._pending, defaultdict(lambda: [0, 0, 0.0, 0, 0])
+        # Edits that don't touch a rolled-up column cancel out
+        rows = [
+            dict(zip(KEY, key), **dict(zip(FIELDS, deltas)))
+            for key, deltas in batch.items() if any(deltas)
+        ]
+        if not rows:
+            return 0
+        try:
+            db.execute(_upsert(db.get_bind().dialect.name), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the deltas back so the next flush retries them
+            with self._lock:
+                for key, deltas in batch.items():
+                    pending = self._pending[key]
+                    for i, delta in enumerate(deltas):
+                        pending[i] += delta
+            raise
+        return len(rows)
+
+    # Bulk rebuild
+
+    def rebuild(self, db):
+        """Recompute every rollup row from the tickets table. Returns the row count."""
+        with self._lock:
+            # Buffered deltas are for committed changes, which the scan below includes
+            self._pending = defaultdict(lambda: [0, 0, 0.0, 0, 0])
+        dialect_name = db.get_bind().dialect.name
+        hours = defaultdict(lambda: [0, 0, 0.0, 0, 0])
+        parsed = {}
+
+        def add(bucket, priority, category, assigned_to, field_values):
+            if bucket is None:
+                return
+            if bucket not in parsed:
+                parsed[bucket] = _utc(datetime.fromisoformat(bucket) if isinstance(bucket, str) else bucket)
+            for dimension, value in _dimension_values(priority, category, assigned_to):
+                totals = hours[(dimension, parsed[bucket], value)]
+                for field, amount in field_values:
+                    totals[field] += amount
+
+        dims = (Ticket.priority, Ticket.category, Ticket.assigned_to)
+        created_hour = _hour_expression(dialect_name, Ticket.created_at)
+        for bucket, priority, category, assigned_to, count in db.execute(
+            select(created_hour, *dims, func.count()).group_by(created_hour, *dims)
+        ):
+            add(bucket, priority, category, assigned_to, ((0, count),))
+
+        resolved_hour = _hour_expression(dialect_name, Ticket.resolved_at)
+        seconds = _seconds_between(dialect_name, Ticket.created_at, Ticket.resolved_at)
+        for bucket, priority, category, assigned_to, count, total, met, breached in db.execute(
+            select(
+                resolved_hour, *dims, func.count(), func.sum(seconds),
+                func.sum(case((Ticket.resolved_at <= Ticket.sla_due, 1), else_=0)),
+                func.sum(case((Ticket.resolved_at > Ticket.sla_due, 1), else_=0)),
+            )
+            .where(Ticket.status.in_(CLOSED_STATUSES), Ticket.resolved_at.isnot(None))
+            .group_by(resolved_hour, *dims)
+        ):
+            add(bucket, priority, category, assigned_to,
+                ((1, count), (2, float(total or 0)), (3, met or 0), (4, breached or 0)))
+
+        days = defaultdict(lambda: [0, 0, 0.0, 0, 0])
+        for (dimension, bucket, value), totals in hours.items():
+            day = days[(dimension, _truncate(bucket, "day"), value)]
+            for i, amount in enumerate(totals):
+                day[i] += amount
+
+        # Buckets formatted the way SQLAlchemy stores DateTime on SQLite, see bulk_insert
+        rows = [
+            (period, dimension, bucket.strftime("%Y-%m-%d %H:%M:%S.%f"), value, *totals)
+            for period, table in (("hour", hours), ("day", days))
+            for (dimension, bucket, value), totals in table.items()
+        ]
+        try:
+            db.execute(delete(_table))
+            bulk_insert(db, _table, KEY + FIELDS, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info("Rebuilt %d ticket rollup rows", len(rows))
+        return len(rows)
+
+    # Reads
+
+    def report(self, db, days=DEFAULT_REPORT_DAYS, now=None):
+        """Activity over the last `days` days (today included), from the rollups only."""
+        days = max(1, min(days, MAX_REPORT_DAYS))
+        now = now or datetime.utcnow()
+        today = _truncate(now, "day")
+        start = today - timedelta(days=days - 1)
+        hour = _truncate(now, "hour")
+        hour_start = hour - timedelta(hours=HOURLY_WINDOW - 1)
+        sums = [func.sum(_table.c[field]) for field in FIELDS]
+
+        def series(period, first, last, step):
+            rows = {
+                _utc(row.bucket): row for row in db.execute(
+                    select(_table).where(
+                        _table.c.period == period, _table.c.dimension == "all",
+                        _table.c.bucket >= first, _table.c.bucket <= last,
+                    )
+                )
+            }
+            points, moment = [], first
+            while moment <= last:
+                row = rows.get(moment)
+                points.append((moment, [getattr(row, field) for field in FIELDS] if row else [0, 0, 0.0, 0, 0]))
+                moment += step
+            return points
+
+        def breakdown(dimension):
+            rows = db.execute(
+                select(_table.c.value, *sums)
+                .where(
+                    _table.c.period == "day", _table.c.dimension == dimension,
+                    _table.c.bucket >= start, _table.c.bucket <= today,
+                )
+                .group_by(_table.c.value)
+            ).all()
+            results = [dict(value=row[0], **summarize(*(v or 0 for v in row[1:]))) for row in rows]
+            return sorted(results, key=lambda r: (-r["created"], r["value"]))
+
+        daily = series("day", start, today, timedelta(days=1))
+        hourly = series("hour", hour_start, hour, timedelta(hours=1))
+        by_priority = breakdown("priority")
+
+        # Tickets take their SLA from the active policy for their priority
+        priority_stats = {row["value"]: row for row in by_priority}
+        policies = db.execute(
+            select(SLAPolicy).where(SLAPolicy.active == True).order_by(SLAPolicy.id)
+        ).scalars().all()
+        sla_policies = [
+            dict(priority_stats.get(policy.priority) or dict(value=policy.priority, **summarize(0, 0, 0.0, 0, 0)),
+                 policy=policy.name, priority=policy.priority, resolution_hours=policy.resolution_hours)
+            for policy in policies
+        ]
+
+        totals = [sum(values[i] for _, values in daily) for i in range(len(FIELDS))]
+        return {
+            "days": days,
+            "start": start.date().isoformat(),
+            "end": today.date().isoformat(),
+            "totals": summarize(*totals),
+            "daily": [dict(date=moment.date().isoformat(), **summarize(*values)) for moment, values in daily],
+            "hourly": [dict(hour=moment.isoformat(), **summarize(*values)) for moment, values in hourly],
+            "by_priority": by_priority,
+            "by_category": breakdown("category"),
+            "by_assignee": breakdown("assigned_to"),
+            "sla_policies": sla_policies,
+        }
+
+    # Background flushing
+
+    def _flush_with(self, session_factory):
+        db = session_factory()
+        try:
+            self.flush(db)
+        except Exception:
+            logger.exception("Ticket rollup flush failed")
+        finally:
+            db.close()
+
+    def start(self, session_factory, interval=FLUSH_SECONDS):
+        """Backfill an empty rollup table, then flush deltas every `interval` seconds."""
+        db = session_factory()
+        try:
+            if db.execute(select(_table.c.period).limit(1)).first() is None and \
+                    db.execute(select(Ticket.id).limit(1)).first() is not None:
+                self.rebuild(db)
+        except Exception:
+            # e.g. another worker backfilling at the same time
+            logger.exception("Ticket rollup backfill failed")
+        finally:
+            db.close()
+
+        self._session_factory = session_factory
+
+        def run():
+            while not self._stop.wait(interval):
+                self._flush_with(session_factory)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="ticket-rollups", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._session_factory is not None:
+            self._flush_with(self._session_factory)
+
+
+rollups = TicketRollups()
+
+
+if __name__ == "__main__":
+    # python -m app.rollups rebuild: recompute the rollups from the tickets table.
+    # Importing app.main registers the auth/pay tables on Base as well.
+    import argparse
+    import time
+    from app.main import engine, SessionLocal
+    from app.schema import ensure_schema
+
+    parser = argparse.ArgumentParser(prog="python -m app.rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        count = rollups.rebuild(db)
+        print(f"Rebuilt {count} rollup rows in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
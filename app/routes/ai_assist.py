@@ -1,32 +1,47 @@
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, status
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc
 from app.database import get_db
-from app.models import AIResponse, Ticket, TicketReply
+from app.models import AIResponse, Ticket
 from app.routes import get_active_subscription
-from google import genai
-import os
+from app.pagination import paginate, InvalidCursor, DEFAULT_PAGE_SIZE
+from app.ai_jobs import suggestions, build_prompt, stream_events, QueueFull, SUGGESTION_TYPES
+from app.ai_models import get_model, ModelUnavailable
+from app.ai_batch import batch_runner
+from app.ai_context import context_builder
+from app.templating import templates
 import json
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+
+# Newest first, keyset paginated (see app/pagination.py)
+AI_ACTIVITY_SORT = [(AIResponse.generated_at, "desc", False), (AIResponse.id, "desc", False)]
 
 @router.get("/ai", response_class=HTMLResponse)
 async def ai_dashboard(
     request: Request,
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     db: Session = Depends(get_db),
     user=Depends(get_active_subscription)
 ):
-    suggestions = db.query(AIResponse).order_by(desc(AIResponse.generated_at)).all()
-    # Join with Ticket to show ticket subject? Or do it in template with lazy loading if efficient enough for prototype
-    # Better to eager load or join, but let's stick to simple query for now.
+    # One query per page: suggestions joined to their ticket's id and subject
+    query = db.query(AIResponse).options(
+        joinedload(AIResponse.ticket).load_only(Ticket.id, Ticket.subject)
+    )
+    try:
+        suggestions, next_cursor = paginate(query, AI_ACTIVITY_SORT, cursor=cursor, limit=limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
     return templates.TemplateResponse("ai/dashboard.html", {
         "request": request,
         "user": user,
-        "suggestions": suggestions
+        "suggestions": suggestions,
+        "next_url": str(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None,
+        "first_url": str(request.url.remove_query_params("cursor")) if cursor else None
     })
 
 @router.post("/api/ai/suggest")
@@ -41,55 +56,97 @@ async def generate_suggestion(
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
         
-    replies = db.query(TicketReply).filter(TicketReply.ticket_id == ticket_id).order_by(TicketReply.created_at).all()
-    
-    # Construct context
-    context = f"Ticket Subject: {ticket.subject}\n"
-    context += f"Description: {ticket.description}\n"
-    context += f"Status: {ticket.status}, Priority: {ticket.priority}, Category: {ticket.category}\n"
-    context += "History:\n"
-    for r in replies:
-        context += f"- {r.author}: {r.content}\n"
+    try:
+        get_model().check()
+    except ModelUnavailable as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
         
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        return JSONResponse({"error": "GOOGLE_API_KEY not set"}, status_code=500)
+    if suggestion_type not in SUGGESTION_TYPES:
+        return JSONResponse({"error": "Invalid suggestion type"}, status_code=400)
         
-    client = genai.Client(api_key=api_key)
+    # Token-budgeted, cached per ticket (see app/ai_context.py)
+    prompt = build_prompt(context_builder.build(db, ticket), suggestion_type)
+    
+    # The model call runs on the worker pool, poll /api/ai/jobs/{job_id} for the result.
+    # An unchanged ticket thread is answered from the suggestion cache.
+    try:
+        job = suggestions.submit(ticket_id, suggestion_type, prompt)
+    except QueueFull:
+        return JSONResponse({"error": "AI assistant is busy, please try again shortly"}, status_code=503)
     
-    prompt = ""
-    if suggestion_type == "reply_draft":
-        prompt = f"You are a helpful support agent. Draft a professional and empathetic reply to this ticket. Context:\n{context}"
-    elif suggestion_type == "summary":
-        prompt = f"Summarize the key points of this support ticket conversation in 3-5 bullet points. Context:\n{context}"
-    elif suggestion_type == "categorization":
-        prompt = f"Analyze this ticket and suggest the most appropriate Category (bug, feature_request, question, billing, account, other) and Priority (low, medium, high, urgent). Provide reasoning. Context:\n{context}"
-    else:
+    return JSONResponse(job.to_dict(), status_code=200 if job.status == "done" else 202)
+
+@router.get("/api/ai/suggest/stream")
+async def stream_suggestion_events(
+    request: Request,
+    ticket_id: int,
+    suggestion_type: str,
+    db: Session = Depends(get_db),
+    user=Depends(get_active_subscription)
+):
+    # Server-Sent Events: "token" events carry text as the model produces it,
+    # then one "done" event with the stored suggestion (or "error")
+    if suggestion_type not in SUGGESTION_TYPES:
         return JSONResponse({"error": "Invalid suggestion type"}, status_code=400)
-        
+    
+    def load_prompt():
+        # Sync session and context builder, kept off the event loop
+        ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
+        if not ticket:
+            return None
+        get_model().check()
+        # Token-budgeted, cached per ticket (see app/ai_context.py)
+        return build_prompt(context_builder.build(db, ticket), suggestion_type)
+    
     try:
-        response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        content = response.text
-        
-        # Save suggestion
-        ai_resp = AIResponse(
-            ticket_id=ticket_id,
-            suggestion_type=suggestion_type,
-            content=content,
-            model_used="gemini-2.5-flash"
-        )
-        db.add(ai_resp)
-        db.commit()
-        db.refresh(ai_resp)
-        
-        return JSONResponse({
-            "id": ai_resp.id,
-            "content": content,
-            "ticket_id": ticket_id
-        })
-        
-    except Exception as e:
+        prompt = await run_in_threadpool(load_prompt)
+    except ModelUnavailable as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    if prompt is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    
+    # Same pool, cache and in-flight jobs as POST /api/ai/suggest
+    try:
+        job = suggestions.submit(ticket_id, suggestion_type, prompt, stream=True)
+    except QueueFull:
+        return JSONResponse({"error": "AI assistant is busy, please try again shortly"}, status_code=503)
+    
+    async def events():
+        # Waits on the event loop; the model runs on the suggestion workers
+        async for event, data in stream_events(job):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Don't let nginx-style proxies buffer the stream
+        "X-Accel-Buffering": "no"
+    })
+
+@router.post("/api/ai/batch/categorize")
+async def start_batch_categorization(user=Depends(get_active_subscription)):
+    # Categorizes the open / uncategorized backlog in the background (see app/ai_batch.py)
+    try:
+        get_model().check()
+    except ModelUnavailable as e:
         return JSONResponse({"error": str(e)}, status_code=500)
+    
+    if not batch_runner.start():
+        return JSONResponse({"error": "A batch categorization is already running", **batch_runner.progress()}, status_code=409)
+    return JSONResponse(batch_runner.progress(), status_code=202)
+
+@router.get("/api/ai/batch/categorize")
+async def batch_categorization_progress(user=Depends(get_active_subscription)):
+    return JSONResponse(batch_runner.progress())
+
+@router.get("/api/ai/jobs/{job_id}")
+async def suggestion_job_status(
+    job_id: str,
+    user=Depends(get_active_subscription)
+):
+    job = suggestions.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job.to_dict())
 
 @router.post("/api/ai/suggest/{id}/accept")
 async def accept_suggestion(
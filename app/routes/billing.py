@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, Request, status, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 import app.routes as routes_module
 from app.routes import get_current_user
+from app.templating import templates
+from app.subscription_cache import subscription_cache
 import os
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/pricing", response_class=HTMLResponse)
 async def pricing_page(request: Request):
@@ -14,6 +14,7 @@ async def pricing_page(request: Request):
 
 @router.post("/subscribe")
 async def subscribe(request: Request, user=Depends(get_current_user)):
+    subscription_cache.invalidate(user.id)
     if not routes_module.create_checkout:
         raise HTTPException(status_code=500, detail="Billing not configured")
 
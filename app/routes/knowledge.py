@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, desc
+from app.database import get_async_db
 from app.models import KnowledgeArticle
 from app.routes import get_active_subscription
+from app.search import search_articles, index_article
+from app.article_stats import article_stats
+from app.related_articles import related_articles
+from app.templating import templates
 from datetime import datetime
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 # PUBLIC ROUTES
 @router.get("/knowledge", response_class=HTMLResponse)
@@ -17,20 +19,20 @@ async def list_articles(
     request: Request,
     search: str = None,
     category: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(KnowledgeArticle).filter(KnowledgeArticle.published == True)
+    stmt = select(KnowledgeArticle).filter(KnowledgeArticle.published == True)
     
-    if search:
-        query = query.filter(or_(
-            KnowledgeArticle.title.ilike(f"%{search}%"),
-            KnowledgeArticle.content.ilike(f"%{search}%"),
-            KnowledgeArticle.tags.ilike(f"%{search}%")
-        ))
     if category:
-        query = query.filter(KnowledgeArticle.category == category)
+        stmt = stmt.filter(KnowledgeArticle.category == category)
+        
+    if search:
+        # Full-text index, ranked by relevance (see app/search.py)
+        stmt = search_articles(stmt, search)
+    else:
+        stmt = stmt.order_by(desc(KnowledgeArticle.views))
         
-    articles = query.order_by(desc(KnowledgeArticle.views)).all()
+    articles = (await db.scalars(stmt)).all()
     
     # Group by category for the view if needed, or just pass list
     # The spec says "Grouped by category, search bar, most viewed articles"
@@ -62,19 +64,21 @@ async def list_articles(
 async def view_article(
     request: Request,
     id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    article = db.query(KnowledgeArticle).filter(KnowledgeArticle.id == id).first()
+    article = await db.get(KnowledgeArticle, id)
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
         
-    # Increment views (simple approach, naive counter)
-    article.views += 1
-    db.commit()
+    # Counted in memory and written in batches, see app/article_stats.py
+    article_stats.add_view(id)
+    pending_views, pending_votes = article_stats.pending(id)
     
     return templates.TemplateResponse("knowledge/article.html", {
         "request": request,
         "article": article,
+        "views": (article.views or 0) + pending_views,
+        "helpful_votes": (article.helpful_votes or 0) + pending_votes,
         "user": None
     })
 
@@ -82,14 +86,13 @@ async def view_article(
 async def vote_article(
     request: Request,
     id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    article = db.query(KnowledgeArticle).filter(KnowledgeArticle.id == id).first()
-    if not article:
+    exists = (await db.execute(select(KnowledgeArticle.id).where(KnowledgeArticle.id == id))).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Article not found")
         
-    article.helpful_votes += 1
-    db.commit()
+    article_stats.add_vote(id)
     return RedirectResponse(url=f"/knowledge/{id}", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -111,7 +114,7 @@ async def create_article(
     category: str = Form(...),
     tags: str = Form(None),
     published: bool = Form(True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
     article = KnowledgeArticle(
@@ -122,18 +125,20 @@ async def create_article(
         published=published
     )
     db.add(article)
-    db.commit()
-    db.refresh(article)
+    await db.flush()
+    await db.run_sync(index_article, article)
+    await db.commit()
+    related_articles.update_article(article)
     return RedirectResponse(url=f"/knowledge/{article.id}", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.get("/knowledge/{id}/edit", response_class=HTMLResponse)
 async def edit_article_form(
     request: Request,
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    article = db.query(KnowledgeArticle).filter(KnowledgeArticle.id == id).first()
+    article = await db.get(KnowledgeArticle, id)
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     return templates.TemplateResponse("knowledge/form.html", {"request": request, "user": user, "article": article})
@@ -147,10 +152,10 @@ async def update_article(
     category: str = Form(...),
     tags: str = Form(None),
     published: bool = Form(True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    article = db.query(KnowledgeArticle).filter(KnowledgeArticle.id == id).first()
+    article = await db.get(KnowledgeArticle, id)
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
         
@@ -160,5 +165,7 @@ async def update_article(
     article.tags = tags
     article.published = published
     
-    db.commit()
+    await db.run_sync(index_article, article)
+    await db.commit()
+    related_articles.update_article(article)
     return RedirectResponse(url=f"/knowledge/{id}", status_code=status.HTTP_303_SEE_OTHER)
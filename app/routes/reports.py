@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.routes import get_active_subscription
+from app.rollups import rollups, DEFAULT_REPORT_DAYS
+from app.templating import templates
+
+router = APIRouter()
+
+# Both read the pre-aggregated rollups only (see app/rollups.py), never the tickets table
+
+@router.get("/reports", response_class=HTMLResponse)
+async def reports_page(
+    request: Request,
+    days: int = DEFAULT_REPORT_DAYS,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_active_subscription)
+):
+    report = await db.run_sync(rollups.report, days)
+    return templates.TemplateResponse("reports/index.html", {
+        "request": request,
+        "user": user,
+        "report": report
+    })
+
+@router.get("/api/reports")
+async def reports_api(
+    days: int = DEFAULT_REPORT_DAYS,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_active_subscription)
+):
+    return await db.run_sync(rollups.report, days)
@@ -1,38 +1,54 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.database import get_async_db
 from app.models import SLAPolicy, Ticket
+from app.pagination import encode_cursor, decode_cursor, clamp_limit, InvalidCursor, DEFAULT_PAGE_SIZE
 from app.routes import get_active_subscription
-from datetime import datetime
+from app.sla_engine import sla_engine
+from app.templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+
+# Order of the breach report, most overdue first; the cursor is the last row's key
+BREACH_SORT = [(Ticket.sla_due, "asc", False), (Ticket.id, "asc", False)]
 
 @router.get("/sla", response_class=HTMLResponse)
 async def list_sla(
     request: Request,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    policies = db.query(SLAPolicy).order_by(SLAPolicy.id).all()
+    policies = (await db.scalars(select(SLAPolicy).order_by(SLAPolicy.id))).all()
     
     # SLA Breach Report
-    # Tickets that are overdue (sla_due < now) and not resolved/closed
-    now = datetime.utcnow()
-    breached_tickets = db.query(Ticket).filter(
-        Ticket.status.notin_(['resolved', 'closed']),
-        Ticket.sla_due != None,
-        Ticket.sla_due < now
-    ).order_by(Ticket.sla_due).all()
+    # Tickets that are overdue and not resolved/closed, tracked by the SLA engine.
+    # Paged by (sla_due, id) so one request loads at most `limit` tickets.
+    if not sla_engine.loaded:
+        await db.run_sync(sla_engine.load)
+    try:
+        after = tuple(decode_cursor(cursor, BREACH_SORT)) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = clamp_limit(limit)
+    keys = sla_engine.breached_keys(limit=limit + 1, after=after)
+    next_cursor = encode_cursor(list(keys[limit - 1])) if len(keys) > limit else None
+    breached_ids = [ticket_id for _, ticket_id in keys[:limit]]
+    by_id = {t.id: t for t in await db.scalars(select(Ticket).where(Ticket.id.in_(breached_ids)))} if breached_ids else {}
+    breached_tickets = [by_id[i] for i in breached_ids if i in by_id]
     
     return templates.TemplateResponse("sla/list.html", {
         "request": request,
         "user": user,
         "policies": policies,
-        "breached_tickets": breached_tickets
+        "breached_tickets": breached_tickets,
+        "breached_total": sla_engine.counts()["breached_sla"],
+        "next_url": str(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None,
+        "first_url": str(request.url.remove_query_params("cursor")) if cursor else None,
     })
 
 @router.post("/sla")
@@ -44,11 +60,11 @@ async def create_update_sla(
     response_hours: int = Form(...),
     resolution_hours: int = Form(...),
     active: bool = Form(True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
     if id:
-        policy = db.query(SLAPolicy).filter(SLAPolicy.id == id).first()
+        policy = await db.get(SLAPolicy, id)
         if not policy:
             raise HTTPException(status_code=404, detail="Policy not found")
         policy.name = name
@@ -66,5 +82,5 @@ async def create_update_sla(
         )
         db.add(policy)
         
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/sla", status_code=status.HTTP_303_SEE_OTHER)
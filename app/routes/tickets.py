@@ -1,15 +1,43 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, asc, or_
-from app.database import get_db
-from app.models import Ticket, TicketReply, SLAPolicy, AIResponse
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, status, UploadFile, File
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import select
+from app.database import get_async_db, get_write_db, ReadSessionLocal
+from app.models import Ticket, TicketReply, SLAPolicy
 from app.routes import get_active_subscription
+from app.pagination import paginate_async, InvalidCursor, DEFAULT_PAGE_SIZE
+from app.ticket_events import publish, snapshot, is_active, TicketState
+from app.triage import TRIAGE_SORT, claim_next_statement
+from app.ticket_import import import_tickets, detect_format
+from app.ticket_export import export_statement, stream_export
+from app.related_articles import related_articles
+from app.duplicates import duplicates
+from app.templating import templates
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+
+# Sort specs for keyset pagination, see app/pagination.py.
+# Each one is backed by a composite index on Ticket.
+TICKET_SORTS = {
+    "created_at": [(Ticket.created_at, "desc", False), (Ticket.id, "desc", False)],
+    "sla_due": [(Ticket.sla_due, "asc", True), (Ticket.id, "asc", False)],
+    # Most urgent first, then earliest deadline (the triage queue order)
+    "priority": TRIAGE_SORT,
+}
+
+def filter_tickets(query, status=None, priority=None, category=None):
+    # Shared by the list page and the export, works on a Query or a select()
+    if status:
+        query = query.filter(Ticket.status == status)
+    if priority:
+        query = query.filter(Ticket.priority == priority)
+    if category:
+        query = query.filter(Ticket.category == category)
+    return query
 
 @router.get("/tickets", response_class=HTMLResponse)
 async def list_tickets(
@@ -18,30 +46,23 @@ async def list_tickets(
     priority: str = None,
     category: str = None,
     sort_by: str = "created_at",
-    db: Session = Depends(get_db),
+    cursor: str = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    query = db.query(Ticket)
-    
-    if status:
-        query = query.filter(Ticket.status == status)
-    if priority:
-        query = query.filter(Ticket.priority == priority)
-    if category:
-        query = query.filter(Ticket.category == category)
-        
-    if sort_by == "priority":
-        # custom sort for priority is hard in SQL without case statement, 
-        # let's just sort by string for now or map it if we can
-        # or rely on enum order if supported. string sort: high > low (alphabetical) is wrong.
-        # simple fix: sort by case statement or just ignore for prototype
-        query = query.order_by(Ticket.priority) 
-    elif sort_by == "sla_due":
-        query = query.order_by(Ticket.sla_due)
-    else:
-        query = query.order_by(desc(Ticket.created_at))
+    stmt = filter_tickets(select(Ticket), status, priority, category)
         
-    tickets = query.all()
+    if sort_by not in TICKET_SORTS:
+        sort_by = "created_at"
+    
+    try:
+        tickets, next_cursor = await paginate_async(db, stmt, TICKET_SORTS[sort_by], cursor=cursor, limit=limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    next_url = str(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None
+    first_url = str(request.url.remove_query_params("cursor")) if cursor else None
     
     return templates.TemplateResponse("tickets/list.html", {
         "request": request,
@@ -50,9 +71,37 @@ async def list_tickets(
         "filter_status": status,
         "filter_priority": priority,
         "filter_category": category,
-        "sort_by": sort_by
+        "sort_by": sort_by,
+        # Same filters, URL-encoded for the Export CSV link
+        "export_query": urlencode({"format": "csv", **{
+            k: v for k, v in (("status", status), ("priority", priority), ("category", category)) if v
+        }}),
+        "next_url": next_url,
+        "first_url": first_url
     })
 
+@router.get("/tickets/export")
+async def export_tickets(
+    status: str = None,
+    priority: str = None,
+    category: str = None,
+    format: str = "csv",
+    include_replies: bool = False,
+    user=Depends(get_active_subscription)
+):
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    
+    # Streamed from its own session in a worker thread (see app/ticket_export.py)
+    stmt = filter_tickets(export_statement(), status, priority, category)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"tickets-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        stream_export(ReadSessionLocal, stmt, format, include_replies),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/tickets/new", response_class=HTMLResponse)
 async def new_ticket_form(request: Request, user=Depends(get_active_subscription)):
     return templates.TemplateResponse("tickets/form.html", {"request": request, "user": user})
@@ -67,12 +116,14 @@ async def create_ticket(
     customer_email: str = Form(...),
     customer_name: str = Form(None),
     assigned_to: str = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
     # Calculate SLA
     sla_due = None
-    policy = db.query(SLAPolicy).filter(SLAPolicy.priority == priority, SLAPolicy.active == True).first()
+    policy = (await db.scalars(
+        select(SLAPolicy).where(SLAPolicy.priority == priority, SLAPolicy.active == True).limit(1)
+    )).first()
     if policy:
         sla_due = datetime.utcnow() + timedelta(hours=policy.resolution_hours)
     
@@ -89,39 +140,109 @@ async def create_ticket(
         sla_due=sla_due
     )
     db.add(new_ticket)
-    db.commit()
-    db.refresh(new_ticket)
+    await db.commit()
+    publish(None, snapshot(new_ticket))
+    # Likely duplicates of open tickets show up on the detail page
+    duplicates.add(new_ticket.id, subject, description)
     
     return RedirectResponse(url=f"/tickets/{new_ticket.id}", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.post("/api/tickets/import")
+async def bulk_import_tickets(
+    file: UploadFile = File(...),
+    format: str = Form(None),
+    db: Session = Depends(get_write_db),
+    user=Depends(get_active_subscription)
+):
+    # CSV or NDJSON, streamed and inserted in batches (see app/ticket_import.py)
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+        
+    # Notifies ticket listeners of the committed rows itself, even on failure
+    report = await run_in_threadpool(import_tickets, db, file.file, fmt, user.id)
+    
+    return JSONResponse(report, status_code=200 if not report["failed"] else 207)
+
+@router.post("/api/tickets/next")
+async def claim_next_ticket(
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_active_subscription)
+):
+    # Atomically assign the head of the triage queue to the caller (see app/triage.py)
+    row = (await db.execute(claim_next_statement(user.email))).first()
+    await db.commit()
+    if row is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    
+    after = TicketState(row.id, row.status, row.priority, row.sla_due, row.resolved_at,
+                        row.category, row.assigned_to, row.created_at)
+    publish(after._replace(status="open", assigned_to=None), after)
+    return {
+        "id": row.id,
+        "subject": row.subject,
+        "priority": row.priority,
+        "status": row.status,
+        "sla_due": row.sla_due.isoformat() if row.sla_due else None,
+        "assigned_to": user.email,
+        "url": f"/tickets/{row.id}"
+    }
+
 @router.get("/tickets/{id}", response_class=HTMLResponse)
 async def ticket_detail(
     request: Request,
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    ticket = db.query(Ticket).filter(Ticket.id == id).first()
+    # Ticket + replies in two queries regardless of thread length
+    ticket = (await db.scalars(
+        select(Ticket).options(selectinload(Ticket.replies)).where(Ticket.id == id)
+    )).first()
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
-        
-    replies = db.query(TicketReply).filter(TicketReply.ticket_id == id).order_by(TicketReply.created_at).all()
     
     return templates.TemplateResponse("tickets/detail.html", {
         "request": request,
         "user": user,
         "ticket": ticket,
-        "replies": replies
+        "replies": ticket.replies,
+        "related_articles": related_articles.for_ticket(ticket),
+        "possible_duplicates": await possible_duplicates(db, ticket)
     })
 
+async def possible_duplicates(db, ticket):
+    # Open tickets with near-identical text (see app/duplicates.py)
+    matches = duplicates.similar(ticket.id, ticket.subject, ticket.description)
+    if not matches:
+        return []
+    rows = {row.id: row for row in await db.execute(
+        select(Ticket.id, Ticket.subject, Ticket.status).where(Ticket.id.in_([m[0] for m in matches]))
+    )}
+    return [
+        {"id": ticket_id, "subject": rows[ticket_id].subject, "status": rows[ticket_id].status, "similarity": score}
+        for ticket_id, score in matches if ticket_id in rows
+    ]
+
+@router.get("/api/tickets/{id}/duplicates")
+async def ticket_duplicates(
+    id: int,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_active_subscription)
+):
+    ticket = await db.get(Ticket, id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return {"ticket_id": id, "duplicates": await possible_duplicates(db, ticket)}
+
 @router.get("/tickets/{id}/edit", response_class=HTMLResponse)
 async def edit_ticket_form(
     request: Request,
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    ticket = db.query(Ticket).filter(Ticket.id == id).first()
+    ticket = await db.get(Ticket, id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
     return templates.TemplateResponse("tickets/form.html", {"request": request, "user": user, "ticket": ticket})
@@ -136,13 +257,14 @@ async def update_ticket(
     priority: str = Form(...),
     category: str = Form(...),
     assigned_to: str = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    ticket = db.query(Ticket).filter(Ticket.id == id).first()
+    ticket = await db.get(Ticket, id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
         
+    before = snapshot(ticket)
     ticket.subject = subject
     ticket.description = description
     ticket.status = status_val
@@ -153,7 +275,11 @@ async def update_ticket(
     # Recalculate SLA if priority changes? 
     # Usually we don't unless explicitly asked, but let's leave as is for now.
     
-    db.commit()
+    after = snapshot(ticket)
+    await db.commit()
+    publish(before, after)
+    if is_active(after):
+        duplicates.add(id, subject, description)
     return RedirectResponse(url=f"/tickets/{id}", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/tickets/{id}/reply")
@@ -163,10 +289,10 @@ async def reply_ticket(
     content: str = Form(...),
     is_internal: bool = Form(False),
     author: str = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    ticket = db.query(Ticket).filter(Ticket.id == id).first()
+    ticket = await db.get(Ticket, id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
         
@@ -185,36 +311,42 @@ async def reply_ticket(
     # Spec doesn't mandate status change on reply, but "waiting" usually means waiting for customer.
     # If agent replies, maybe set to "waiting". Let's keep it simple and just add reply.
     
-    db.commit()
+    await db.commit()
     return RedirectResponse(url=f"/tickets/{id}", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/tickets/{id}/resolve")
 async def resolve_ticket(
     request: Request,
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    ticket = db.query(Ticket).filter(Ticket.id == id).first()
+    ticket = await db.get(Ticket, id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
         
+    before = snapshot(ticket)
     ticket.status = "resolved"
     ticket.resolved_at = datetime.utcnow()
-    db.commit()
+    after = snapshot(ticket)
+    await db.commit()
+    publish(before, after)
     return RedirectResponse(url=f"/tickets/{id}", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/tickets/{id}/close")
 async def close_ticket(
     request: Request,
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_active_subscription)
 ):
-    ticket = db.query(Ticket).filter(Ticket.id == id).first()
+    ticket = await db.get(Ticket, id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
         
+    before = snapshot(ticket)
     ticket.status = "closed"
-    db.commit()
+    after = snapshot(ticket)
+    await db.commit()
+    publish(before, after)
     return RedirectResponse(url=f"/tickets", status_code=status.HTTP_303_SEE_OTHER)
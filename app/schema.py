@@ -0,0 +1,137 @@
+import hashlib
+import logging
+from datetime import datetime
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, text, delete, insert, update, case, inspect, func
+from sqlalchemy.schema import CreateTable, CreateIndex
+from app.database import Base
+
+# Schema version check, so worker startup can skip DDL.
+# The version is a hash of the CREATE TABLE / CREATE INDEX statements for every
+# table on Base (models plus the auth/pay tables). It is stored in a one-row
+# schema_version table; when the stored value matches, startup does a single
+# SELECT instead of create_all plus a checkfirst round trip per index.
+#
+# When it differs, one worker applies the DDL while holding a database-wide
+# lock (pg_advisory_xact_lock on Postgres, BEGIN IMMEDIATE on SQLite) and the
+# others wait, then see the new version and skip.
+#
+# create_all only creates missing tables, so applying a version also adds
+# columns missing from existing tables (new columns must be nullable), runs
+# the idempotent data backfills below and drops indexes the models no longer
+# declare in OBSOLETE_INDEXES.
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_TABLE = "schema_version"
+# Arbitrary application-wide key for pg_advisory_xact_lock
+ADVISORY_LOCK_KEY = 728163901
+
+# Replaced by the priority_rank indexes, then by their sla_due_sort versions
+OBSOLETE_INDEXES = (
+    "ix_tickets_priority_id", "ix_tickets_status_priority_id", "ix_tickets_category_priority_id",
+    "ix_tickets_priority_rank_sla_due_id", "ix_tickets_status_priority_rank_sla_due_id",
+    "ix_tickets_category_priority_rank_sla_due_id",
+)
+
+_metadata = MetaData()
+schema_version = Table(
+    SCHEMA_TABLE, _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def metadata_version(dialect):
+    """Hash of the DDL Base.metadata would emit on `dialect`."""
+    import app.models  # noqa: F401 (registers the tables on Base)
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+
+def stored_version(conn):
+    if not inspect(conn).has_table(SCHEMA_TABLE):
+        return None
+    return conn.execute(select(schema_version.c.version).where(schema_version.c.id == 1)).scalar()
+
+
+def _lock(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    elif conn.dialect.name == "sqlite":
+        # Take the write lock now rather than at the first write, so a second
+        # worker blocks here instead of reading the old version
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _add_missing_columns(conn):
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            conn.exec_driver_sql(
+                f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                f"{column.type.compile(dialect=conn.dialect)}"
+            )
+            logger.info("Added column %s.%s", table.name, column.name)
+
+
+def _backfill(conn):
+    from app.models import Ticket, PRIORITY_RANKS, UNKNOWN_PRIORITY_RANK, NO_SLA_DUE
+    conn.execute(
+        update(Ticket.__table__)
+        .where(Ticket.priority_rank.is_(None))
+        .values(priority_rank=case(PRIORITY_RANKS, value=Ticket.priority, else_=UNKNOWN_PRIORITY_RANK))
+    )
+    conn.execute(
+        update(Ticket.__table__)
+        .where(Ticket.sla_due_sort.is_(None))
+        .values(sla_due_sort=func.coalesce(Ticket.sla_due, NO_SLA_DUE))
+    )
+
+
+def ensure_schema(engine):
+    """Bring the database up to the current models if needed.
+
+    Returns (applied, previous_version): whether this call ran the DDL, and
+    the version stored before it (None for a database that never had one).
+    """
+    version = metadata_version(engine.dialect)
+    with engine.connect() as conn:
+        previous = stored_version(conn)
+    if previous == version:
+        return False, previous
+
+    with engine.begin() as conn:
+        _lock(conn)
+        previous = stored_version(conn)
+        if previous == version:
+            # Another worker got there first
+            return False, previous
+
+        _add_missing_columns(conn)
+        Base.metadata.create_all(bind=conn)
+        # create_all skips tables that already exist, so indexes added later
+        # (e.g. the ticket list pagination indexes) need creating explicitly
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        _backfill(conn)
+
+        _metadata.create_all(bind=conn)
+        conn.execute(delete(schema_version))
+        conn.execute(insert(schema_version).values(id=1, version=version, applied_at=datetime.utcnow()))
+
+    logger.info("Schema updated to version %s (was %s)", version[:12], previous and previous[:12])
+    return True, previous
@@ -0,0 +1,113 @@
+import logging
+import re
+from sqlalchemy import text, func, literal_column, table, column
+from sqlalchemy.exc import OperationalError
+from app.models import KnowledgeArticle
+
+# Full-text search for knowledge articles.
+# - SQLite: an FTS5 table keyed by article id, ranked with bm25().
+#   The ORM doesn't know about it, so create_article/update_article call
+#   index_article() inside their transaction to keep it in sync.
+# - Postgres: a GIN expression index over a weighted tsvector, ranked with
+#   ts_rank_cd(). The index maintains itself.
+# - Anything else (or SQLite built without FTS5): the old ILIKE scan.
+#
+# Every search term is a prefix match ("inv" finds "invoice") and all terms
+# must match. Tags weigh most, then title, then content.
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "knowledge_articles_fts"
+# bm25 column weights, in FTS column order: title, content, tags
+BM25_WEIGHTS = (2.0, 1.0, 4.0)
+
+# Postgres weights: A (tags) > B (title) > C (content)
+PG_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(tags, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(title, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+_backend = None  # "fts5", "postgres" or None (ILIKE fallback)
+
+_fts = table(FTS_TABLE, column("rowid"))
+
+
+def setup(engine):
+    """Create the search index if needed and backfill it. Run at startup, after seeding."""
+    global _backend
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    "USING fts5(title, content, tags, tokenize='porter unicode61')"
+                ))
+                indexed = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+                total = conn.execute(text("SELECT count(*) FROM knowledge_articles")).scalar()
+                if indexed != total:
+                    _rebuild(conn)
+        except OperationalError:
+            logger.warning("SQLite FTS5 unavailable, knowledge search falls back to LIKE")
+            return
+        _backend = "fts5"
+    elif dialect == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_knowledge_articles_search "
+                f"ON knowledge_articles USING GIN (({PG_VECTOR}))"
+            ))
+        _backend = "postgres"
+
+
+def _rebuild(conn):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) "
+        "SELECT id, title, content, coalesce(tags, '') FROM knowledge_articles"
+    ))
+
+
+def index_article(db, article):
+    """Write `article` into the FTS table. The article must have been flushed (needs an id)."""
+    if _backend != "fts5":
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": article.id})
+    db.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) VALUES (:id, :title, :content, :tags)"),
+        {"id": article.id, "title": article.title, "content": article.content, "tags": article.tags or ""}
+    )
+
+
+def _terms(search):
+    return re.findall(r"\w+", search.lower())
+
+
+def search_articles(query, search):
+    """Restrict a KnowledgeArticle query to matches for `search`, best match first."""
+    terms = _terms(search)
+    if not terms:
+        return query.order_by(KnowledgeArticle.views.desc())
+
+    if _backend == "fts5":
+        match = " ".join(f'"{t}"*' for t in terms)
+        rank = func.bm25(literal_column(FTS_TABLE), *BM25_WEIGHTS)
+        return (query.join(_fts, _fts.c.rowid == KnowledgeArticle.id)
+                .filter(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match))
+                .order_by(rank))
+
+    if _backend == "postgres":
+        tsquery = func.to_tsquery("english", " & ".join(f"{t}:*" for t in terms))
+        vector = literal_column(PG_VECTOR)
+        return (query.filter(vector.op("@@")(tsquery))
+                .order_by(func.ts_rank_cd(vector, tsquery).desc()))
+
+    for t in terms:
+        like = f"%{t}%"
+        query = query.filter(
+            KnowledgeArticle.title.ilike(like)
+            | KnowledgeArticle.content.ilike(like)
+            | KnowledgeArticle.tags.ilike(like)
+        )
+    return query.order_by(KnowledgeArticle.views.desc())
@@ -1,5 +1,11 @@
+import csv
+import io
+import time
+from itertools import repeat
+import numpy as np
+from sqlalchemy import insert, select, func, text
 from sqlalchemy.orm import Session
-from app.models import Ticket, TicketReply, KnowledgeArticle, SLAPolicy, AIResponse
+from app.models import Ticket, TicketReply, KnowledgeArticle, SLAPolicy, AIResponse, PRIORITY_RANKS
 from datetime import datetime, timedelta
 
 def seed_app_data(db: Session):
@@ -56,10 +62,8 @@ def seed_app_data(db: Session):
         db.add(ticket)
         created_tickets.append(ticket)
         
-    db.commit()
-    # Refresh to get IDs
-    for t in created_tickets:
-        db.refresh(t)
+    # One batched INSERT assigns all the IDs, no per-row refresh needed
+    db.flush()
         
     # Map original index (1-based) to actual ID
     ticket_map = {i+1: t.id for i, t in enumerate(created_tickets)}
@@ -107,3 +111,328 @@ def seed_app_data(db: Session):
             db.add(resp)
             
     db.commit()
+
+
+# Synthetic data at scale, for load and benchmark testing.
+# generate_data() writes a deterministic dataset (same seed and sizes, same
+# rows) of tickets, replies, knowledge articles and AI suggestions. Columns are
+# drawn with NumPy in chunks of GENERATE_CHUNK tickets, using realistic
+# distributions:
+# - volume grows towards the present, and falls on weekends and at night
+# - older tickets are mostly resolved or closed; recent ones are still active
+# - urgent tickets are resolved faster
+# - a few customers file many tickets
+# Each chunk is one bulk Core insert per table (COPY on Postgres).
+# Ids are assigned here, so replies reference their tickets without a round
+# trip. Run it with `python -m app.seed generate --tickets 1000000`.
+
+GENERATE_CHUNK = 50000
+# Ticket count from which indexes are dropped during the load and rebuilt after
+REBUILD_INDEXES_FROM = 100000
+
+GEN_STATUSES_ACTIVE = (["open", "in_progress", "waiting"], [0.5, 0.3, 0.2])
+GEN_STATUSES_DONE = (["resolved", "closed"], [0.7, 0.3])
+GEN_PRIORITIES = (["low", "medium", "high", "urgent"], [0.30, 0.42, 0.20, 0.08])
+GEN_CATEGORIES = (["bug", "feature_request", "question", "billing", "account", "other"],
+                  [0.22, 0.12, 0.25, 0.16, 0.17, 0.08])
+GEN_RESOLUTION_HOURS = {"urgent": 4, "high": 12, "medium": 24, "low": 72}
+GEN_TEAMS = {
+    "bug": "Engineering", "feature_request": "Product Team", "question": "Support Team",
+    "billing": "Billing Team", "account": "Support Team", "other": "Support Team",
+}
+# Relative ticket volume per hour of day (UTC)
+GEN_HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 8, 10, 10, 9, 8, 9, 10, 10, 9, 7, 5, 4, 3, 2, 2, 1]
+GEN_SUBJECTS = {
+    "bug": ["{feature} returns an error", "{feature} is very slow", "{feature} not working in {browser}",
+            "Error 500 when using {feature}", "{feature} crashes after the latest update"],
+    "feature_request": ["Feature request: {feature} improvements", "Please add {feature} to the mobile app",
+                        "Would love an API for {feature}", "Integration request: {feature} with Slack"],
+    "question": ["How do I use {feature}?", "Question about {feature} limits", "Where can I find {feature}?",
+                 "How to set up {feature} for my team?"],
+    "billing": ["Charged twice this month", "Need an invoice for {month}", "Refund request for {month}",
+                "Question about my {plan} plan", "Cancel my {plan} subscription"],
+    "account": ["Cannot log in to my account", "Password reset email never arrives", "Need to change account owner",
+                "SSO login fails for {browser} users", "Account locked after failed logins"],
+    "other": ["Feedback on {feature}", "Partnership inquiry", "General question", "Data request for {month}"],
+}
+GEN_FEATURES = ["CSV export", "bulk import", "the dashboard", "notifications", "reports", "the API",
+                "webhooks", "search", "file uploads", "user permissions", "SSO", "the mobile app"]
+GEN_BROWSERS = ["Chrome", "Firefox", "Safari", "Edge"]
+GEN_MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+              "September", "October", "November", "December"]
+GEN_PLANS = ["Free", "Premium", "Enterprise"]
+GEN_SENTENCES = [
+    "This started happening after the last release.", "It affects everyone on our team.",
+    "We tried clearing the cache and a different browser.", "Please advise as soon as possible.",
+    "Screenshots are attached.", "It worked fine last week.", "This is blocking our month-end close.",
+    "We have about {n} users on the account.", "The error message says something went wrong.",
+    "Can you tell us when this will be fixed?", "Our admin already checked the settings.",
+    "We are on the {plan} plan.",
+]
+GEN_REPLIES = [
+    "Thanks for reaching out, we're looking into this now.", "Could you send us a screenshot of the error?",
+    "We've reproduced the issue and passed it to engineering.", "A fix has been deployed, can you confirm it works?",
+    "Thanks, that worked!", "It's still happening on our side.", "I've escalated this to the billing team.",
+    "Here is a link to the relevant help article.", "Closing this out, let us know if anything else comes up.",
+]
+GEN_INTERNAL = ["Checked the logs, looks related to the recent deploy.", "Customer is on a legacy plan.",
+                "Possible duplicate of an earlier ticket.", "Waiting on engineering for an ETA."]
+GEN_ARTICLE_TOPICS = [
+    ("getting_started", "Getting started with {feature}", "setup,onboarding"),
+    ("troubleshooting", "Troubleshooting {feature}", "troubleshooting,error"),
+    ("billing", "Billing: {plan} plan invoices and refunds", "billing,invoice,refund"),
+    ("features", "Using {feature} effectively", "features,tips"),
+    ("api", "API reference: {feature}", "api,integration,developer"),
+]
+GEN_AI_TYPES = (["reply_draft", "summary", "categorization"], [0.5, 0.3, 0.2])
+
+
+def _pick(rng, choices, size):
+    values, weights = choices
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=weights)]
+
+
+def _text_pool(rng, templates, size, sentences=0):
+    pool = []
+    for _ in range(size):
+        line = templates[rng.integers(len(templates))]
+        if sentences:
+            line = " ".join([line] + [GEN_SENTENCES[i] for i in rng.choice(len(GEN_SENTENCES), sentences, replace=False)])
+        pool.append(line.format(
+            feature=GEN_FEATURES[rng.integers(len(GEN_FEATURES))],
+            browser=GEN_BROWSERS[rng.integers(len(GEN_BROWSERS))],
+            month=GEN_MONTHS[rng.integers(len(GEN_MONTHS))],
+            plan=GEN_PLANS[rng.integers(len(GEN_PLANS))],
+            n=int(rng.integers(2, 500)),
+        ))
+    return np.array(pool, dtype=object)
+
+
+def _datetimes(base, offsets_seconds):
+    # Formatted the way SQLAlchemy stores DateTime on SQLite; Postgres' COPY
+    # parses the same text
+    stamps = np.datetime64(base, "us") + offsets_seconds.astype("timedelta64[s]")
+    return np.char.replace(np.datetime_as_string(stamps, unit="us"), "T", " ").astype(object)
+
+
+def _next_id(db, model):
+    return (db.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def bulk_insert(db, table, columns, rows):
+    """Insert rows (tuples in `columns` order, values already in storage
+    format) with COPY on Postgres, otherwise the driver's executemany."""
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if v is None else v for v in row])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+        return
+    # Skips SQLAlchemy's per-row parameter processing, most of the cost at this size
+    placeholders = ", ".join("?" * len(columns))
+    db.connection().exec_driver_sql(f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def generate_data(db, tickets=100000, replies_per_ticket=3.0, articles=2000, ai_ratio=0.25,
+                  days=365, seed=42, now=None, progress=None):
+    """Append a synthetic dataset; see the notes above. Returns row counts."""
+    rng = np.random.default_rng(seed)
+    now = (now or datetime.utcnow()).replace(microsecond=0)
+    span = days * 86400
+    counts = {"tickets": 0, "replies": 0, "articles": 0, "ai_responses": 0}
+
+    if not db.execute(select(func.count(SLAPolicy.id))).scalar():
+        db.execute(insert(SLAPolicy.__table__), [
+            {"name": p.title(), "priority": p, "response_hours": max(1, h // 4), "resolution_hours": h, "active": True}
+            for p, h in GEN_RESOLUTION_HOURS.items()
+        ])
+
+    subjects = {c: _text_pool(rng, t, 400) for c, t in GEN_SUBJECTS.items()}
+    descriptions = _text_pool(rng, ["{feature}:"], 3000, sentences=3)
+    replies_pool = np.array(GEN_REPLIES, dtype=object)
+    internal_pool = np.array(GEN_INTERNAL, dtype=object)
+    hour_p = np.array(GEN_HOUR_WEIGHTS, dtype=float) / sum(GEN_HOUR_WEIGHTS)
+
+    ticket_columns = ["id", "user_id", "subject", "description", "status", "priority", "priority_rank",
+                      "category", "assigned_to", "customer_email", "customer_name", "sla_due",
+                      "sla_due_sort", "resolved_at", "created_at", "updated_at"]
+    reply_columns = ["id", "ticket_id", "author", "content", "is_internal", "created_at"]
+    ai_columns = ["id", "ticket_id", "suggestion_type", "content", "model_used", "accepted", "generated_at"]
+    next_ticket, next_reply, next_ai = _next_id(db, Ticket), _next_id(db, TicketReply), _next_id(db, AIResponse)
+    start = now - timedelta(seconds=span)
+
+    # Creation times (seconds after `start`) for every ticket, in order, so ids
+    # follow time like real data and index inserts are mostly appends.
+    # Volume grows linearly towards `now`; weekends and nights are quieter.
+    day = np.floor(np.sqrt(rng.random(tickets)) * days).astype(np.int64)
+    weekday = ((np.datetime64(start.date(), "D") + day).astype(np.int64) + 3) % 7  # 0 = Monday
+    # Most weekend tickets move to a weekday of the same week
+    moved = (weekday >= 5) & (rng.random(tickets) < 0.6)
+    day = np.where(moved, np.clip(day - weekday + rng.integers(0, 5, tickets), 0, days - 1), day)
+    offsets = day * 86400 + rng.choice(24, tickets, p=hour_p) * 3600 + rng.integers(0, 3600, tickets)
+    offsets = np.sort(np.minimum(offsets, span - 1))
+
+    # Large loads are faster without index maintenance: drop the secondary
+    # indexes and build each once at the end
+    rebuild_indexes = tickets >= REBUILD_INDEXES_FROM
+    generated_tables = (Ticket.__table__, TicketReply.__table__, AIResponse.__table__)
+    if rebuild_indexes:
+        for table in generated_tables:
+            for index in table.indexes:
+                index.drop(bind=db.connection(), checkfirst=True)
+        db.commit()
+
+    try:
+        for chunk_start in range(0, tickets, GENERATE_CHUNK):
+            n = min(GENERATE_CHUNK, tickets - chunk_start)
+            ids = np.arange(next_ticket, next_ticket + n)
+            next_ticket += n
+            offset = offsets[chunk_start:chunk_start + n]
+            age_days = (span - offset) / 86400
+
+            category = _pick(rng, GEN_CATEGORIES, n)
+            priority = _pick(rng, GEN_PRIORITIES, n)
+            active = rng.random(n) < 0.03 + 0.9 * np.exp(-age_days / 10)
+            status = np.where(active, _pick(rng, GEN_STATUSES_ACTIVE, n), _pick(rng, GEN_STATUSES_DONE, n))
+            resolution = np.array([GEN_RESOLUTION_HOURS[p] for p in priority]) * 3600
+            resolved_after = np.minimum(rng.lognormal(0, 0.8, n) * resolution * 0.6, span - offset - 1).astype(np.int64)
+            customer = np.minimum(rng.zipf(1.6, n), tickets)
+            assigned = np.where(rng.random(n) < 0.15, None, [GEN_TEAMS[c] for c in category])
+            subject = [subjects[c][i] for c, i in zip(category, rng.integers(0, 400, n))]
+            description = descriptions[rng.integers(0, len(descriptions), n)]
+
+            created_at = _datetimes(start, offset)
+            resolved_at = np.where(status == "resolved", _datetimes(start, offset + resolved_after), None)
+            ranks = [PRIORITY_RANKS[p] for p in priority]
+            emails = [f"customer{c}@example.com" for c in customer.tolist()]
+            # zip() over whole columns is much faster than building rows one index at a time
+            sla_due = _datetimes(start, offset + resolution)
+            rows = list(zip(
+                ids.tolist(), repeat("generated"), subject, description, status, priority, ranks, category, assigned,
+                emails, repeat(None), sla_due, sla_due, resolved_at, created_at, created_at
+            ))
+            bulk_insert(db, Ticket.__table__, ticket_columns, rows)
+
+            # Replies: more on older, finished tickets; spaced out after creation
+            reply_counts = rng.poisson(replies_per_ticket * np.where(active, 0.6, 1.2))
+            total = int(reply_counts.sum())
+            reply_ticket = np.repeat(np.arange(n), reply_counts)
+            position = np.arange(total) - np.repeat(np.cumsum(reply_counts) - reply_counts, reply_counts)
+            reply_offset = np.minimum(offset[reply_ticket] + (position + 1) * rng.integers(600, 6 * 3600, total),
+                                      span - 1)
+            internal = rng.random(total) < 0.08
+            content = np.where(internal, internal_pool[rng.integers(0, len(internal_pool), total)],
+                               replies_pool[rng.integers(0, len(replies_pool), total)])
+            author = np.where(internal | (position % 2 == 0), "Support Team", "customer").astype(object)
+            rows = list(zip(
+                range(next_reply, next_reply + total), ids[reply_ticket].tolist(), author, content,
+                internal.tolist(), _datetimes(start, reply_offset)
+            ))
+            next_reply += total
+            bulk_insert(db, TicketReply.__table__, reply_columns, rows)
+
+            # AI suggestions on a share of the tickets
+            with_ai = np.flatnonzero(rng.random(n) < ai_ratio)
+            ai_types = _pick(rng, GEN_AI_TYPES, len(with_ai))
+            accepted = rng.random(len(with_ai)) < 0.4
+            ai_created = _datetimes(start, np.minimum(offset[with_ai] + 60, span - 1))
+            rows = [
+                (next_ai + j, int(ids[i]), ai_types[j], f"Generated {ai_types[j].replace('_', ' ')} for: {subject[i]}",
+                 "generated", bool(accepted[j]), ai_created[j])
+                for j, i in enumerate(with_ai)
+            ]
+            next_ai += len(rows)
+            bulk_insert(db, AIResponse.__table__, ai_columns, rows)
+
+            db.commit()
+            counts["tickets"] += n
+            counts["replies"] += total
+            counts["ai_responses"] += len(rows)
+            if progress:
+                progress(counts)
+
+        article_rows = []
+        for i in range(articles):
+            category, title, tags = GEN_ARTICLE_TOPICS[rng.integers(len(GEN_ARTICLE_TOPICS))]
+            feature, plan = GEN_FEATURES[rng.integers(len(GEN_FEATURES))], GEN_PLANS[rng.integers(len(GEN_PLANS))]
+            body = " ".join(GEN_SENTENCES[j] for j in rng.choice(len(GEN_SENTENCES), 5, replace=False))
+            views = int(rng.pareto(1.2) * 50)
+            article_rows.append({
+                "title": title.format(feature=feature, plan=plan),
+                "content": f"## Overview\nHow {feature} works on the {plan} plan.\n\n## Details\n{body.format(n=10, plan=plan)}",
+                "category": category,
+                "tags": tags,
+                "published": bool(rng.random() < 0.9),
+                "views": views,
+                "helpful_votes": int(views * rng.random() * 0.2),
+            })
+        if article_rows:
+            db.execute(insert(KnowledgeArticle.__table__), article_rows)
+        counts["articles"] = articles
+        db.commit()
+    finally:
+        # Also after a failed or interrupted load, so the committed chunks keep
+        # their indexes (ensure_schema won't restore them: the schema version
+        # still matches) and Postgres sequences start past the copied ids
+        db.rollback()
+        if rebuild_indexes:
+            for table in generated_tables:
+                for index in table.indexes:
+                    index.create(bind=db.connection(), checkfirst=True)
+        if db.get_bind().dialect.name == "postgresql":
+            # COPY with explicit ids doesn't advance the serial sequences
+            for table in ("tickets", "ticket_replies", "ai_responses"):
+                db.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                ))
+        db.commit()
+    return counts
+
+
+if __name__ == "__main__":
+    # python -m app.seed: create/upgrade the schema and load the demo data.
+    # python -m app.seed generate --tickets N: append synthetic data instead.
+    # Importing app.main registers the auth/pay tables on Base as well.
+    import argparse
+    from app.main import engine, SessionLocal
+    from app.schema import ensure_schema
+    from app import search
+    from app.rollups import rollups
+
+    parser = argparse.ArgumentParser(prog="python -m app.seed")
+    commands = parser.add_subparsers(dest="command")
+    generate = commands.add_parser("generate", help="append a deterministic synthetic dataset")
+    generate.add_argument("--tickets", type=int, default=100000)
+    generate.add_argument("--replies-per-ticket", type=float, default=3.0, help="average")
+    generate.add_argument("--articles", type=int, default=2000)
+    generate.add_argument("--ai-ratio", type=float, default=0.25, help="share of tickets with an AI suggestion")
+    generate.add_argument("--days", type=int, default=365, help="history length")
+    generate.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "generate":
+            started = time.perf_counter()
+            counts = generate_data(
+                db, args.tickets, args.replies_per_ticket, args.articles, args.ai_ratio, args.days, args.seed,
+                progress=lambda c: print(f"{c['tickets']} tickets, {c['replies']} replies "
+                                         f"({time.perf_counter() - started:.1f}s)", flush=True)
+            )
+            print(f"Generated {counts} in {time.perf_counter() - started:.1f}s")
+        else:
+            seed_app_data(db)
+        # Reporting rollups include the new tickets
+        rollups.rebuild(db)
+    finally:
+        db.close()
+    # Backfill the knowledge base search index for the new articles
+    search.setup(engine)
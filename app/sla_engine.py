@@ -0,0 +1,211 @@
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from app.models import Ticket
+from app.ticket_events import CLOSED_STATUSES, is_active
+
+# In-memory SLA deadline scheduler.
+# Active tickets' sla_due deadlines are loaded once at startup and then kept
+# current from ticket lifecycle events. Two min-heaps hold the next
+# "approaching" (due - SLA_WARNING_WINDOW) and "breached" (due) times; a daemon
+# thread sleeps until the earliest one and emits the transition the moment it
+# happens. Heap entries are invalidated lazily: an entry only counts if it
+# still matches the ticket's current deadline.
+#
+# The dashboard and /sla read the approaching/breached sets straight from here
+# instead of scanning tickets. SLA_RELOAD_SECONDS re-syncs with the database
+# to pick up changes made by other worker processes.
+
+logger = logging.getLogger(__name__)
+
+SLA_WARNING_WINDOW = timedelta(hours=2)
+RELOAD_SECONDS = int(os.environ.get("SLA_RELOAD_SECONDS", "300"))
+# Upper bound on a single sleep, guards against clock jumps
+MAX_SLEEP_SECONDS = 60
+
+
+class SLAEngine:
+    def __init__(self, window=SLA_WARNING_WINDOW):
+        self.window = window
+        self._cond = threading.Condition()
+        self._deadlines = {}  # ticket id -> sla_due, active tickets only
+        self._approach_heap = []  # (due - window, due, id)
+        self._breach_heap = []  # (due, id)
+        self._approaching = set()
+        self._breached = set()
+        self._listeners = []
+        self._stopped = False
+        self._thread = None
+        self.loaded = False
+
+    def subscribe(self, listener):
+        """Register `listener(kind, ticket_id, sla_due)`, kind is "approaching" or "breached"."""
+        self._listeners.append(listener)
+
+    # Loading
+
+    def load(self, db):
+        rows = db.query(Ticket.id, Ticket.sla_due).filter(
+            Ticket.status.notin_(CLOSED_STATUSES),
+            Ticket.sla_due != None
+        ).all()
+        now = datetime.utcnow()
+        with self._cond:
+            self._deadlines = {ticket_id: due for ticket_id, due in rows}
+            self._approaching = set()
+            self._breached = set()
+            self._approach_heap = []
+            self._breach_heap = []
+            # Classify silently: tickets already past a threshold at load time
+            # are not new transitions
+            for ticket_id, due in self._deadlines.items():
+                if due <= now:
+                    self._breached.add(ticket_id)
+                    continue
+                self._breach_heap.append((due, ticket_id))
+                if due - self.window <= now:
+                    self._approaching.add(ticket_id)
+                else:
+                    self._approach_heap.append((due - self.window, due, ticket_id))
+            heapq.heapify(self._approach_heap)
+            heapq.heapify(self._breach_heap)
+            self.loaded = True
+            self._cond.notify()
+
+    # Ticket lifecycle
+
+    def apply(self, old, new):
+        old_due = old.sla_due if old is not None and is_active(old) else None
+        new_due = new.sla_due if new is not None and is_active(new) else None
+        if old_due == new_due and (old is None or new is None or old.id == new.id):
+            return
+        with self._cond:
+            if old is not None:
+                self._untrack(old.id)
+            if new is not None and new_due is not None:
+                self._track(new.id, new_due)
+            self._cond.notify()
+
+    def _track(self, ticket_id, due):
+        self._deadlines[ticket_id] = due
+        heapq.heappush(self._breach_heap, (due, ticket_id))
+        heapq.heappush(self._approach_heap, (due - self.window, due, ticket_id))
+
+    def _untrack(self, ticket_id):
+        self._deadlines.pop(ticket_id, None)
+        self._approaching.discard(ticket_id)
+        self._breached.discard(ticket_id)
+        # Stale heap entries are skipped when popped; compact if they pile up
+        if len(self._breach_heap) > 2 * len(self._deadlines) + 1024:
+            self._breach_heap = [e for e in self._breach_heap if self._deadlines.get(e[1]) == e[0]]
+            self._approach_heap = [e for e in self._approach_heap if self._deadlines.get(e[2]) == e[1]]
+            heapq.heapify(self._breach_heap)
+            heapq.heapify(self._approach_heap)
+
+    # Scheduling
+
+    def _advance(self, now):
+        """Pop every threshold reached by `now`, return the transitions."""
+        events = []
+        while self._breach_heap and self._breach_heap[0][0] <= now:
+            due, ticket_id = heapq.heappop(self._breach_heap)
+            if self._deadlines.get(ticket_id) != due or ticket_id in self._breached:
+                continue
+            self._approaching.discard(ticket_id)
+            self._breached.add(ticket_id)
+            events.append(("breached", ticket_id, due))
+        while self._approach_heap and self._approach_heap[0][0] <= now:
+            _, due, ticket_id = heapq.heappop(self._approach_heap)
+            if self._deadlines.get(ticket_id) != due:
+                continue
+            if ticket_id in self._breached or ticket_id in self._approaching:
+                continue
+            self._approaching.add(ticket_id)
+            events.append(("approaching", ticket_id, due))
+        return events
+
+    def _seconds_until_next(self, now):
+        upcoming = [h[0][0] for h in (self._approach_heap, self._breach_heap) if h]
+        if not upcoming:
+            return MAX_SLEEP_SECONDS
+        return min(MAX_SLEEP_SECONDS, max(0.0, (min(upcoming) - now).total_seconds()))
+
+    def _emit(self, events):
+        for kind, ticket_id, due in events:
+            logger.info("SLA %s: ticket #%s (due %s)", kind, ticket_id, due)
+            for listener in self._listeners:
+                try:
+                    listener(kind, ticket_id, due)
+                except Exception:
+                    logger.exception("SLA listener %r failed", listener)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = datetime.utcnow()
+                events = self._advance(now)
+                if not events:
+                    self._cond.wait(self._seconds_until_next(now))
+                    continue
+            self._emit(events)
+
+    def start(self, session_factory, reload_interval=RELOAD_SECONDS):
+        db = session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+        def reload():
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopped, timeout=reload_interval)
+                    if self._stopped:
+                        return
+                db = session_factory()
+                try:
+                    self.load(db)
+                except Exception:
+                    logger.exception("SLA engine reload failed")
+                finally:
+                    db.close()
+
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="sla-engine", daemon=True)
+        self._thread.start()
+        threading.Thread(target=reload, name="sla-engine-reload", daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    # Reads
+
+    def counts(self):
+        with self._cond:
+            return {"approaching_sla": len(self._approaching), "breached_sla": len(self._breached)}
+
+    def breached_ids(self):
+        """Breached ticket ids, most overdue first."""
+        return [ticket_id for _, ticket_id in self.breached_keys()]
+
+    def breached_keys(self, limit=None, after=None):
+        """(sla_due, id) of breached tickets, most overdue first: at most `limit`
+        of them, starting after the key `after`."""
+        with self._cond:
+            keys = ((self._deadlines[ticket_id], ticket_id) for ticket_id in self._breached)
+            if after is not None:
+                keys = (key for key in keys if key > after)
+            return sorted(keys) if limit is None else heapq.nsmallest(limit, keys)
+
+    def approaching_ids(self):
+        with self._cond:
+            return sorted(self._approaching, key=lambda ticket_id: (self._deadlines[ticket_id], ticket_id))
+
+
+sla_engine = SLAEngine()
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Per-user cache of the subscription check (require_active_subscription in
+# app/main.py), so a signed-in user's page views and AI calls skip the
+# viv-pay customer lookup. Only successful checks are cached, so a user who
+# just subscribed gets through on their next request. Entries expire after
+# SUBSCRIPTION_CACHE_TTL_SECONDS, and at most SUBSCRIPTION_CACHE_SIZE users are
+# kept (least recently used out). A TTL of 0 turns the cache off.
+#
+# Billing changes clear the cache explicitly:
+# - /subscribe invalidates the caller's entry.
+# - BillingInvalidationMiddleware clears all entries after any request whose
+#   path contains one of SUBSCRIPTION_CACHE_INVALIDATE_PATHS. viv-pay owns the
+#   checkout return and Stripe webhook routes, and a webhook names a Stripe
+#   customer rather than one of our users.
+# The TTL bounds staleness for changes that reach viv-pay some other way, or
+# through another worker process.
+
+TTL_SECONDS = float(os.environ.get("SUBSCRIPTION_CACHE_TTL_SECONDS", "60"))
+MAX_SIZE = int(os.environ.get("SUBSCRIPTION_CACHE_SIZE", "10000"))
+INVALIDATE_PATHS = tuple(
+    p.strip() for p in os.environ.get("SUBSCRIPTION_CACHE_INVALIDATE_PATHS", "webhook,stripe,billing,checkout,subscribe").split(",")
+    if p.strip()
+)
+
+MISSING = object()
+
+
+class SubscriptionCache:
+    def __init__(self, ttl=TTL_SECONDS, max_size=MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user id -> (expires at, value)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation: a check that started before one is not cached
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Cached check result for `user_id`, or MISSING."""
+        if self.ttl <= 0:
+            return MISSING
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, value, generation):
+        """Cache `value`, unless the cache was invalidated since `generation` was read."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+
+subscription_cache = SubscriptionCache()
+
+
+class BillingInvalidationMiddleware:
+    """Clears the subscription cache after billing and payment webhook requests."""
+
+    def __init__(self, app, cache=subscription_cache, paths=INVALIDATE_PATHS):
+        self.app = app
+        self.cache = cache
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(p in scope["path"] for p in self.paths):
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # After the request, so checks racing it re-read the new state
+            self.cache.clear()
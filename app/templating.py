@@ -0,0 +1,35 @@
+import logging
+import os
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+# The one Jinja environment shared by every router.
+# Compiled template code is cached on disk (TEMPLATE_CACHE_DIR, Jinja's temp
+# dir by default) so a restarted worker loads bytecode instead of re-parsing,
+# and precompile() runs at startup so no request pays for the first compile.
+# Templates are not re-checked for changes unless TEMPLATES_AUTO_RELOAD is set,
+# which is only wanted in local development.
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = "app/templates"
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR")
+TEMPLATES_AUTO_RELOAD = os.environ.get("TEMPLATES_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+
+if TEMPLATE_CACHE_DIR:
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+templates = Jinja2Templates(
+    directory=TEMPLATE_DIR,
+    auto_reload=TEMPLATES_AUTO_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+)
+
+
+def precompile():
+    """Load every template into the environment's cache. Returns the count."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    logger.info("Precompiled %d templates", len(names))
+    return len(names)
@@ -0,0 +1,81 @@
+import logging
+from collections import namedtuple
+from sqlalchemy import inspect
+
+# Ticket lifecycle notifications.
+# Routes that create or change tickets call publish(before, after) once the
+# change is committed; in-memory subsystems (dashboard counters, SLA engine, ...)
+# subscribe in app/main.py. States are plain snapshots so listeners never touch
+# a live ORM object or session.
+#
+# Bulk writes (imports, generators) call publish_bulk(db) once instead, and
+# bulk listeners resync from the database. Bulk inserts that know the rows
+# they committed also call publish_inserted(states) per batch (with id None),
+# for listeners that can apply new tickets without a rescan.
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = ("resolved", "closed")
+
+TicketState = namedtuple(
+    "TicketState",
+    ["id", "status", "priority", "sla_due", "resolved_at", "category", "assigned_to", "created_at"],
+    defaults=(None, None, None),
+)
+
+_listeners = []
+_bulk_listeners = []
+_inserted_listeners = []
+
+
+def snapshot(ticket):
+    # created_at comes from a server default, so right after an insert it isn't
+    # loaded (and can't be lazy loaded under asyncio); listeners read None as "now"
+    created_at = inspect(ticket).dict.get("created_at")
+    return TicketState(ticket.id, ticket.status, ticket.priority, ticket.sla_due, ticket.resolved_at,
+                       ticket.category, ticket.assigned_to, created_at)
+
+
+def is_active(state):
+    return state.status not in CLOSED_STATUSES
+
+
+def subscribe(listener):
+    """Register `listener(old, new)`; either argument may be None (create / delete)."""
+    _listeners.append(listener)
+
+
+def publish(old, new):
+    for listener in _listeners:
+        try:
+            listener(old, new)
+        except Exception:
+            # Listeners only hold derived state and reconcile periodically,
+            # a failure must not fail the request
+            logger.exception("Ticket event listener %r failed", listener)
+
+
+def subscribe_bulk(listener):
+    """Register `listener(db)`, called after many tickets changed at once."""
+    _bulk_listeners.append(listener)
+
+
+def publish_bulk(db):
+    for listener in _bulk_listeners:
+        try:
+            listener(db)
+        except Exception:
+            logger.exception("Ticket bulk listener %r failed", listener)
+
+
+def subscribe_inserted(listener):
+    """Register `listener(states)`, called with the states of tickets inserted in bulk."""
+    _inserted_listeners.append(listener)
+
+
+def publish_inserted(states):
+    for listener in _inserted_listeners:
+        try:
+            listener(states)
+        except Exception:
+            logger.exception("Ticket insert listener %r failed", listener)
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from sqlalchemy import select
+from app.models import Ticket, TicketReply
+
+# Streaming ticket export (CSV or NDJSON).
+# Rows are read with yield_per (a server-side cursor on Postgres) as plain Core
+# rows, so no ORM identities pile up, and each partition is encoded and handed
+# to the StreamingResponse before the next one is fetched. Replies, when
+# requested, are loaded with one IN query per partition.
+
+CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    "id", "user_id", "subject", "description", "status", "priority", "category",
+    "assigned_to", "customer_email", "customer_name", "sla_due", "resolved_at",
+    "created_at", "updated_at",
+]
+
+REPLY_COLUMNS = ["id", "author", "content", "is_internal", "created_at"]
+
+
+def export_statement():
+    table = Ticket.__table__
+    return select(*[table.c[name] for name in EXPORT_COLUMNS]).order_by(table.c.id)
+
+
+def _value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _replies_for(db, ticket_ids):
+    table = TicketReply.__table__
+    stmt = (select(table.c.ticket_id, *[table.c[name] for name in REPLY_COLUMNS])
+            .where(table.c.ticket_id.in_(ticket_ids))
+            .order_by(table.c.ticket_id, table.c.created_at, table.c.id))
+    replies = defaultdict(list)
+    for row in db.execute(stmt):
+        replies[row.ticket_id].append({name: _value(getattr(row, name)) for name in REPLY_COLUMNS})
+    return replies
+
+
+def stream_export(session_factory, stmt, fmt, include_replies=False):
+    """Generator of encoded export chunks. Opens its own session since it
+    runs after the request's dependencies have been cleaned up."""
+    db = session_factory()
+    try:
+        columns = EXPORT_COLUMNS + (["replies"] if include_replies else [])
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode()
+
+        result = db.execute(stmt.execution_options(yield_per=CHUNK_SIZE))
+        for partition in result.partitions():
+            records = [{name: _value(getattr(row, name)) for name in EXPORT_COLUMNS} for row in partition]
+            if include_replies:
+                replies = _replies_for(db, [r["id"] for r in records])
+                for record in records:
+                    record["replies"] = replies.get(record["id"], [])
+
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for record in records:
+                    if include_replies:
+                        record["replies"] = json.dumps(record["replies"])
+                    writer.writerow([record[name] for name in columns])
+                yield buffer.getvalue().encode()
+            else:
+                yield "".join(json.dumps(record) + "\n" for record in records).encode()
+    finally:
+        db.close()
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
+from app.models import Ticket, SLAPolicy, priority_rank
+from app.ticket_events import publish_bulk, publish_inserted, TicketState
+
+# Streaming bulk ticket import (CSV or NDJSON).
+# Records are parsed one at a time from the upload and inserted with a single
+# executemany per IMPORT_BATCH_SIZE rows, each batch in its own transaction,
+# so memory stays flat regardless of file size. A failing batch is rolled
+# back and reported; the import carries on with the next one. A file that
+# stops being valid UTF-8 ends the import with a file error, keeping the
+# batches already committed. Ticket listeners are notified (publish_bulk) of
+# whatever was committed, however the import ends, and of each committed
+# batch's rows (publish_inserted).
+
+BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+# Cap on row-level errors kept in the report
+MAX_REPORTED_ERRORS = 100
+
+TICKET_STATUSES = ("open", "in_progress", "waiting", "resolved", "closed")
+TICKET_PRIORITIES = ("low", "medium", "high", "urgent")
+TICKET_CATEGORIES = ("bug", "feature_request", "question", "billing", "account", "other")
+
+REQUIRED_FIELDS = ("subject", "description", "priority", "category", "customer_email")
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def detect_format(filename, content_type=None):
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or (content_type or "").endswith("ndjson"):
+        return "ndjson"
+    return "csv"
+
+
+def iter_records(fileobj, fmt):
+    """Yield (line_number, record dict) from a binary file object."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "ndjson":
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ImportRowError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ImportRowError("Expected a JSON object")
+                continue
+            yield line_number, record
+    else:
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # e.g. a NUL byte or an oversized field; the reader carries on after it
+                yield reader.line_num, ImportRowError(f"Invalid CSV: {e}")
+                continue
+            # line_num is the reader's position, header is line 1
+            yield reader.line_num, record
+
+
+def load_policy_hours(db):
+    """Active SLA resolution hours by priority, loaded once per import."""
+    hours = {}
+    for policy in db.query(SLAPolicy).filter(SLAPolicy.active == True).order_by(SLAPolicy.id):
+        hours.setdefault(policy.priority, policy.resolution_hours)
+    return hours
+
+
+def _parse_datetime(value, field):
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise ImportRowError(f"Invalid datetime for {field}: {value!r}")
+    # Stored as naive UTC like the rest of the app
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def build_row(record, user_id, policy_hours, now):
+    """Validate one imported record and turn it into a tickets insert row."""
+    row = {field: _clean(record.get(field)) for field in (
+        "subject", "description", "priority", "category", "customer_email",
+        "customer_name", "assigned_to", "status"
+    )}
+    missing = [f for f in REQUIRED_FIELDS if not row[f]]
+    if missing:
+        raise ImportRowError(f"Missing required field(s): {', '.join(missing)}")
+
+    row["priority"] = row["priority"].lower()
+    row["category"] = row["category"].lower()
+    row["status"] = (row["status"] or "open").lower()
+    if row["priority"] not in TICKET_PRIORITIES:
+        raise ImportRowError(f"Invalid priority: {row['priority']!r}")
+    if row["category"] not in TICKET_CATEGORIES:
+        raise ImportRowError(f"Invalid category: {row['category']!r}")
+    if row["status"] not in TICKET_STATUSES:
+        raise ImportRowError(f"Invalid status: {row['status']!r}")
+    if len(row["subject"]) > 200:
+        raise ImportRowError("Subject longer than 200 characters")
+    row["priority_rank"] = priority_rank(row["priority"])
+
+    created_at = _parse_datetime(record.get("created_at"), "created_at")
+    if created_at is not None:
+        row["created_at"] = created_at
+    row["resolved_at"] = _parse_datetime(record.get("resolved_at"), "resolved_at")
+
+    sla_due = _parse_datetime(record.get("sla_due"), "sla_due")
+    if sla_due is None and row["priority"] in policy_hours:
+        sla_due = (created_at or now) + timedelta(hours=policy_hours[row["priority"]])
+    row["sla_due"] = sla_due
+
+    row["user_id"] = str(user_id)
+    return row
+
+
+def import_tickets(db, fileobj, fmt, user_id):
+    """Stream records from `fileobj` into the tickets table, return a report dict.
+    Publishes the committed rows to ticket listeners before returning or raising."""
+    policy_hours = load_policy_hours(db)
+    now = datetime.utcnow()
+    report = {"format": fmt, "imported": 0, "failed": 0, "batches": 0, "errors": []}
+
+    def record_error(entry):
+        report["failed"] += entry.get("rows", 1)
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append(entry)
+
+    batch, first_line = [], None
+
+    def flush(last_line):
+        report["batches"] += 1
+        # Plain dict rows with identical keys go through a single executemany
+        stmt = insert(Ticket.__table__)
+        try:
+            db.execute(stmt, batch)
+            db.commit()
+            report["imported"] += len(batch)
+        except Exception as e:
+            db.rollback()
+            record_error({
+                "batch": report["batches"],
+                "lines": f"{first_line}-{last_line}",
+                "rows": len(batch),
+                "error": str(e).splitlines()[0][:300],
+            })
+            return
+        publish_inserted([
+            TicketState(None, row["status"], row["priority"], row["sla_due"], row["resolved_at"],
+                        row["category"], row["assigned_to"], row["created_at"])
+            for row in batch
+        ])
+
+    last_line = 0
+    try:
+        try:
+            for line_number, record in iter_records(fileobj, fmt):
+                last_line = line_number
+                try:
+                    if isinstance(record, ImportRowError):
+                        raise record
+                    row = build_row(record, user_id, policy_hours, now)
+                except ImportRowError as e:
+                    record_error({"line": line_number, "error": str(e)})
+                    continue
+                # executemany needs every row to have the same keys
+                row.setdefault("created_at", now)
+                if not batch:
+                    first_line = line_number
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    flush(line_number)
+                    batch = []
+        except UnicodeDecodeError as e:
+            # The decoder can't resync, so the rest of the file is unreadable
+            record_error({"line": last_line + 1, "error": f"File is not valid UTF-8 ({e.reason}), stopped reading here"})
+
+        if batch:
+            flush(last_line)
+    finally:
+        if report["imported"]:
+            publish_bulk(db)
+    return report
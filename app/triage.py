@@ -0,0 +1,39 @@
+from sqlalchemy import select, update
+from app.models import Ticket
+from app.pagination import order_clauses
+
+# Triage queue: open, unassigned tickets, most urgent priority first, then
+# earliest SLA deadline (tickets without one last, via Ticket.sla_due_sort). Agents take the head of the queue with
+# claim_next_statement(), a single UPDATE ... RETURNING:
+# - Postgres: the candidate row is picked with FOR UPDATE SKIP LOCKED, so
+#   concurrent claims each lock a different row instead of queueing on one.
+# - SQLite: FOR UPDATE is not emitted; the UPDATE runs under SQLite's single
+#   writer lock, so the pick and the assignment are atomic anyway.
+# Either way the outer WHERE re-checks the row is still unclaimed.
+
+# Sort spec (see app/pagination.py), also the list page's "priority" sort
+TRIAGE_SORT = [
+    (Ticket.priority_rank, "asc", False),
+    (Ticket.sla_due_sort, "asc", False),
+    (Ticket.id, "asc", False),
+]
+
+
+def claim_next_statement(assignee):
+    candidate = (
+        select(Ticket.id)
+        .where(Ticket.status == "open", Ticket.assigned_to.is_(None))
+        .order_by(*order_clauses(TRIAGE_SORT))
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Ticket)
+        .where(Ticket.id == candidate.scalar_subquery(), Ticket.status == "open", Ticket.assigned_to.is_(None))
+        .values(assigned_to=assignee, status="in_progress")
+        .returning(
+            Ticket.id, Ticket.subject, Ticket.status, Ticket.priority, Ticket.sla_due, Ticket.resolved_at,
+            Ticket.category, Ticket.assigned_to, Ticket.created_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
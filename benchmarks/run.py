@@ -0,0 +1,229 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Route benchmarks: boots the app in-process against a fresh SQLite database,
+# seeds a deterministic dataset (generate_data in app/seed.py) and times each
+# scenario below through Starlette's TestClient. Auth and the subscription
+# check are replaced through dependency_overrides, so only the app's own work
+# is measured.
+#
+#   python -m benchmarks.run                      # report to benchmarks/report.json
+#   python -m benchmarks.run --tickets 20000 --requests 500 --concurrency 4
+#   python -m benchmarks.run --update-baseline    # accept the current numbers
+#
+# Each scenario reports throughput and p50/p95/p99 latency. The run exits
+# non-zero if any request failed or if a scenario's p95 latency or throughput
+# is worse than benchmarks/baseline.json by more than --tolerance. Baselines
+# are only comparable on the same machine and dataset size, so regenerate it
+# on the machine that runs the check.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPORT = os.path.join(BENCH_DIR, "report.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+# Fixed, so generated timestamps (and SLA states) match between runs
+DATASET_NOW = datetime(2024, 6, 1)
+# /knowledge?search= terms, all present in generated articles
+SEARCH_TERMS = ["export", "invoice refund", "webhooks", "permissions", "troubleshooting", "api reference"]
+
+
+class BenchUser:
+    id = 1
+    email = "bench@example.com"
+    name = "Benchmark"
+
+
+def bench_user():
+    return BenchUser()
+
+
+def _configure_environment(workdir):
+    # Must run before app modules are imported: they read these at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ.pop("DATABASE_READ_URL", None)
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.pop("ASYNC_DATABASE_READ_URL", None)
+    os.environ["SEED_DEMO_DATA"] = "false"
+    os.environ["AI_MODEL_BACKEND"] = "fake"
+    os.environ["DUPLICATE_INDEX_PATH"] = f"{workdir}/duplicate_index.npz"
+    os.environ["TEMPLATE_CACHE_DIR"] = f"{workdir}/templates"
+
+
+def scenarios(rng, tickets, search_terms):
+    """(name, method, path factory, form factory or None); writes come last."""
+    def ticket_id():
+        return rng.randint(1, tickets)
+
+    def new_ticket():
+        return {
+            "subject": f"Benchmark ticket {rng.randint(1, 10 ** 9)}",
+            "description": "Export to CSV times out for large date ranges.",
+            "priority": rng.choice(["low", "medium", "high", "urgent"]),
+            "category": "bug",
+            "customer_email": "bench-customer@example.com",
+        }
+
+    def edit_ticket():
+        form = new_ticket()
+        form["status"] = rng.choice(["open", "in_progress", "waiting"])
+        return form
+
+    return [
+        ("dashboard", "GET", lambda: "/", None),
+        ("ticket_list", "GET", lambda: "/tickets", None),
+        ("ticket_list_filtered", "GET", lambda: "/tickets?status=open&sort_by=priority", None),
+        ("ticket_detail", "GET", lambda: f"/tickets/{ticket_id()}", None),
+        ("knowledge_search", "GET", lambda: f"/knowledge?search={rng.choice(search_terms)}", None),
+        ("sla", "GET", lambda: "/sla", None),
+        ("ai_activity", "GET", lambda: "/ai", None),
+        ("reports", "GET", lambda: "/reports", None),
+        ("create_ticket", "POST", lambda: "/tickets/new", new_ticket),
+        ("reply_ticket", "POST", lambda: f"/tickets/{ticket_id()}/reply", lambda: {"content": "Thanks, looking into it."}),
+        ("update_ticket", "POST", lambda: f"/tickets/{ticket_id()}/edit", edit_ticket),
+        ("resolve_ticket", "POST", lambda: f"/tickets/{ticket_id()}/resolve", lambda: {}),
+    ]
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def run_scenario(client, method, path, form, requests, warmup, concurrency):
+    def one():
+        url = path()
+        data = form() if form else None
+        started = time.perf_counter()
+        response = client.request(method, url, data=data, follow_redirects=False)
+        return time.perf_counter() - started, response.status_code < 400
+
+    for _ in range(warmup):
+        one()
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda _: one(), range(requests)))
+    else:
+        results = [one() for _ in range(requests)]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regression messages for scenarios worse than the baseline."""
+    problems = []
+    for name, result in report["results"].items():
+        if result["errors"]:
+            problems.append(f"{name}: {result['errors']} failed requests")
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{name}: {result['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark the app's routes")
+    parser.add_argument("--tickets", type=int, default=2000)
+    parser.add_argument("--replies-per-ticket", type=float, default=3.0)
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument("--report", default=DEFAULT_REPORT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown, 0.3 = 30%%")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="helpdesk-bench-")
+    _configure_environment(workdir)
+
+    from fastapi.testclient import TestClient
+    from app.main import app, engine, SessionLocal
+    from app.schema import ensure_schema
+    import app.routes as routes_module
+    from app.seed import generate_data
+
+    app.dependency_overrides[routes_module.get_current_user] = bench_user
+    app.dependency_overrides[routes_module.get_active_subscription] = bench_user
+
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        dataset = generate_data(db, args.tickets, args.replies_per_ticket, args.articles, seed=args.seed, now=DATASET_NOW)
+        seed_seconds = round(time.perf_counter() - started, 2)
+    finally:
+        db.close()
+
+    rng = random.Random(args.seed)
+    results = {}
+    with TestClient(app) as client:
+        for name, method, path, form in scenarios(rng, args.tickets, SEARCH_TERMS):
+            if args.only and name not in args.only:
+                continue
+            results[name] = run_scenario(client, method, path, form, args.requests, args.warmup, args.concurrency)
+            r = results[name]
+            print(f"{name:<22} {r['throughput_rps']:>8} req/s  p50 {r['p50_ms']:>8}ms  "
+                  f"p95 {r['p95_ms']:>8}ms  p99 {r['p99_ms']:>8}ms  errors {r['errors']}", flush=True)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "seed_seconds": seed_seconds,
+        "settings": {"requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency, "seed": args.seed},
+        "results": results,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with (run with --update-baseline to store one)")
+        return 1 if any(r["errors"] for r in results.values()) else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("dataset") != dataset or baseline.get("settings") != report["settings"]:
+        print("Warning: baseline was recorded with a different dataset or settings")
+    problems = compare(report, baseline, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
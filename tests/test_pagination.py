@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from app.models import Ticket
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+CREATED_SORT = [(Ticket.created_at, "desc", False), (Ticket.id, "desc", False)]
+SLA_DUE_SORT = [(Ticket.sla_due, "asc", True), (Ticket.id, "asc", False)]
+
+
+def _raw_cursor(payload):
+    raw = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def test_round_trip():
+    values = [datetime(2024, 5, 1, 12, 30, 15, 250), 42]
+    assert decode_cursor(encode_cursor(values), CREATED_SORT) == values
+
+
+def test_null_allowed_for_nullable_key():
+    assert decode_cursor(encode_cursor([None, 7]), SLA_DUE_SORT) == [None, 7]
+
+
+@pytest.mark.parametrize("payload", [
+    [["v", "x"], ["v", "y"]],                # wrong types for (created_at, id)
+    [["dt", "2024-05-01T12:00:00"], ["v", "7"]],  # id as a string
+    [["dt", "2024-05-01T12:00:00"], ["v", True]],
+    [["v", 1714564800], ["v", 7]],           # datetime without the dt tag
+    [["dt", "not a date"], ["v", 7]],
+    [["dt", "2024-05-01T12:00:00"], ["v", None]],  # None for a non-null key
+    [["dt", "2024-05-01T12:00:00"]],         # too short
+    [["dt", "2024-05-01T12:00:00"], 7],
+    {"created_at": "2024-05-01T12:00:00", "id": 7},
+])
+def test_tampered_cursor_rejected(payload):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(_raw_cursor(payload), CREATED_SORT)
+
+
+def test_garbage_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("%%%not-base64", CREATED_SORT)